@@ -0,0 +1,306 @@
+"""Offline benchmarks for the data layer at large member counts.
+
+Generates synthetic data files in a temporary folder and times data_management, username lookups,
+the club leaderboard build and the rank saver loop without connecting to Discord.
+
+Usage (from the repository root):
+    python -m benchmarks.data_layer --members 10000 50000 200000 --output bench_results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_ROOT)
+
+from cogs import clubs_cog
+from cogs import data_management
+from cogs import rank_saver_cog
+from cogs import username_cog
+from cogs import utility_cog
+
+CLUB_PREFIX = "bench"
+RANK_NAMES = ["Daiou", "Taikou", "N1", "N2", "N3", "N4"]
+
+#########################################
+
+# Synthetic data
+
+
+def generate_member_ids(member_count, seed):
+    generator = random.Random(seed)
+    return generator.sample(range(10**17, 10**18), member_count)
+
+
+def generate_user_records(member_ids, works_per_member, seed):
+    generator = random.Random(seed)
+    work_ids = [f"work{index}" for index in range(max(works_per_member * 4, 1))]
+    return {
+        member_id: [[work_id, generator.randint(1, 5)] for work_id in generator.sample(work_ids, works_per_member)]
+        for member_id in member_ids
+    }
+
+
+def generate_works(works_count):
+    return {f"work{index}": [f"Work title {index}", "2023-01", "2023-02", ""] for index in range(works_count)}
+
+
+def generate_user_names(member_ids):
+    return {member_id: f"user{index}" for index, member_id in enumerate(member_ids)}
+
+
+def generate_user_ranks(member_ids, seed):
+    generator = random.Random(seed)
+    return {member_id: [generator.choice(RANK_NAMES)] for member_id in member_ids}
+
+
+def generate_emoji_stats(emoji_count, seed):
+    generator = random.Random(seed)
+    return {f"emoji{index}": generator.randint(0, 100000) for index in range(emoji_count)}
+
+
+def write_data_files(member_ids, works_per_member, emoji_count, seed):
+    data_files = {
+        f"{CLUB_PREFIX}_user_record.yml": generate_user_records(member_ids, works_per_member, seed),
+        f"{CLUB_PREFIX}_read_works.yml": generate_works(works_per_member * 4),
+        username_cog.FILE_NAME: generate_user_names(member_ids),
+        rank_saver_cog.USER_RANKS_FILE_NAME: generate_user_ranks(member_ids, seed),
+        "emoji_stats.yml": generate_emoji_stats(emoji_count, seed),
+    }
+    os.makedirs("data", exist_ok=True)
+    for file_name, data in data_files.items():
+        data_management.dump_yaml_file(data, f"data/{file_name}")
+    shutil.rmtree(data_management.SIDECAR_FOLDER, ignore_errors=True)
+    return data_files
+
+
+#########################################
+
+# Fake Discord objects
+
+
+class FakeMessage:
+    message_ids = itertools.count(1)
+    edit_count = 0
+
+    def __init__(self, channel, embed=None):
+        self.id = next(self.message_ids)
+        self.channel = channel
+        self.embeds = [embed] if embed else []
+        self.author = SimpleNamespace(id=0)
+
+    async def pin(self):
+        pass
+
+    async def unpin(self):
+        self.channel.pinned_messages.remove(self)
+
+    async def edit(self, embed=None):
+        FakeMessage.edit_count += 1
+        self.embeds = [embed]
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.guild = None
+        self.messages = dict()
+        self.pinned_messages = []
+
+    async def pins(self):
+        return list(self.pinned_messages)
+
+    def get_partial_message(self, message_id):
+        return self.messages[message_id]
+
+    async def send(self, embed=None, allowed_mentions=None):
+        message = FakeMessage(self, embed)
+        self.messages[message.id] = message
+        self.pinned_messages.append(message)
+        return message
+
+
+def build_fake_guild(member_ids, present_ratio, seed):
+    generator = random.Random(seed)
+    roles = [SimpleNamespace(id=index, name=name) for index, name in enumerate(RANK_NAMES)]
+    members = {
+        member_id: SimpleNamespace(
+            id=member_id, bot=False, mention=f"<@{member_id}>", roles=[generator.choice(roles)], name=str(member_id)
+        )
+        for member_id in member_ids
+        if generator.random() < present_ratio
+    }
+    channel = FakeChannel(1)
+    channel.guild = SimpleNamespace(
+        id=1,
+        channels=[channel],
+        roles=roles,
+        members=list(members.values()),
+        me=SimpleNamespace(id=0),
+        get_member=members.get,
+    )
+    return channel.guild
+
+
+#########################################
+
+# Timing
+
+
+async def time_operation(operation, repeat, setup=None):
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            await setup()
+        start = time.perf_counter()
+        await operation()
+        durations.append(time.perf_counter() - start)
+    return {
+        "runs": repeat,
+        "mean_seconds": statistics.mean(durations),
+        "min_seconds": min(durations),
+        "max_seconds": max(durations),
+    }
+
+
+async def reset_data_management():
+    await data_management.flush_data()
+    data_management.data_cache.clear()
+    data_management.dirty_files.clear()
+
+
+async def clear_sidecars():
+    await reset_data_management()
+    shutil.rmtree(data_management.SIDECAR_FOLDER, ignore_errors=True)
+
+
+async def no_delay():
+    pass
+
+
+async def run_size(member_count, arguments):
+    member_ids = generate_member_ids(member_count, arguments.seed)
+    data_files = write_data_files(member_ids, arguments.works_per_member, arguments.emoji, arguments.seed)
+    guild = build_fake_guild(member_ids, arguments.present_ratio, arguments.seed)
+    results = dict()
+
+    for file_name in data_files:
+
+        async def load():
+            await data_management.load_data(file_name)
+
+        results[f"load_cold[{file_name}]"] = await time_operation(load, arguments.repeat, clear_sidecars)
+        results[f"load_sidecar[{file_name}]"] = await time_operation(load, arguments.repeat, reset_data_management)
+        results[f"load_cached[{file_name}]"] = await time_operation(load, arguments.repeat)
+
+        async def save_and_flush():
+            data = await data_management.load_data(file_name)
+            key = next(iter(data))
+            data[key] = data[key]
+            await data_management.save_data(data, file_name)
+            data_management.mark_dirty(file_name)
+            await data_management.flush_data()
+
+        results[f"save_flush[{file_name}]"] = await time_operation(save_and_flush, arguments.repeat)
+
+    username_cog.DATA_LOADED = False
+    lookup_ids = random.Random(arguments.seed).choices(member_ids, k=arguments.lookups)
+
+    async def lookup_user_names():
+        for user_id in lookup_ids:
+            await username_cog.get_user_name(None, user_id)
+
+    results[f"get_user_name[x{arguments.lookups}]"] = await time_operation(lookup_user_names, arguments.repeat)
+
+    clubs_cog.clubs_settings = [{"club_prefix": CLUB_PREFIX, "club_name": "Bench Club", "club_channel": 1}]
+    clubs_cog.POINTS_INDEX.clear()
+
+    async def build_leaderboard():
+        await clubs_cog.update_leaderboard_pins(guild, CLUB_PREFIX, None)
+
+    FakeMessage.edit_count = 0
+    results["update_leaderboard_pins"] = await time_operation(build_leaderboard, arguments.repeat)
+    results["update_leaderboard_pins"]["message_edits"] = FakeMessage.edit_count
+
+    async def look_up_club_ranks():
+        points_index = await clubs_cog.get_points_index(CLUB_PREFIX)
+        for user_id in lookup_ids:
+            points_index.get_rank(user_id)
+
+    results[f"club_rank[x{arguments.lookups}]"] = await time_operation(look_up_club_ranks, arguments.repeat)
+
+    rank_saver = SimpleNamespace(guild=guild, role_names_to_save=RANK_NAMES[:-1])
+
+    async def save_ranks():
+        await rank_saver_cog.RankSaver.rank_saver.coro(rank_saver)
+
+    results["rank_saver"] = await time_operation(save_ranks, arguments.repeat)
+    await reset_data_management()
+    return results
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPOSITORY_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(arguments):
+    # The background loops wait a random time before running, which is not part of the measurement.
+    utility_cog.random_delay = no_delay
+    report = {
+        "commit": get_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "yaml_loader": data_management.SafeLoader.__name__,
+        "parameters": {key: value for key, value in vars(arguments).items() if key != "output"},
+        "results": dict(),
+    }
+
+    working_directory = os.getcwd()
+    for member_count in arguments.members:
+        with tempfile.TemporaryDirectory(prefix="bench_data_layer_") as temporary_folder:
+            os.chdir(temporary_folder)
+            try:
+                print(f"BENCHMARK: Running with {member_count} members.")
+                report["results"][str(member_count)] = await run_size(member_count, arguments)
+            finally:
+                os.chdir(working_directory)
+
+    output = json.dumps(report, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            output_file.write(output)
+        print(f"BENCHMARK: Wrote results to {arguments.output}")
+    else:
+        print(output)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the data layer with synthetic guild data.")
+    parser.add_argument("--members", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--works-per-member", type=int, default=3)
+    parser.add_argument("--emoji", type=int, default=500)
+    parser.add_argument("--present-ratio", type=float, default=0.8, help="Share of members still in the guild.")
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_arguments()))
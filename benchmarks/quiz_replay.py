@@ -0,0 +1,183 @@
+"""Offline replay of recorded Kotoba game reports through the rank quiz verification.
+
+Every report is checked the way LevelUp.level_up_routine checks it, against a fake member who holds the rank
+role the quiz is meant for. Prints the decision for each report together with the verification latency.
+
+Usage (from the repository root):
+    python -m benchmarks.quiz_replay --reports data/kotoba_reports --settings settings.yml --output replay.json
+
+With --expected, the decisions are compared to an earlier run and the exit code is 1 on any difference. Use
+--write-expected to record the current decisions as that baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import yaml
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_ROOT)
+
+from cogs import levelup_cog
+from cogs import quiz_rules
+
+FAKE_MEMBER_ID = 1
+
+#########################################
+
+# Reports and fake members
+
+
+def load_reports(report_folder):
+    reports = dict()
+    for file_name in sorted(os.listdir(report_folder)):
+        quiz_id, extension = os.path.splitext(file_name)
+        if extension != ".json":
+            continue
+        with open(os.path.join(report_folder, file_name)) as report_file:
+            reports[quiz_id] = json.load(report_file)
+    return reports
+
+
+def build_fake_member(rank_index: levelup_cog.RankIndex, quiz_data):
+    """A member holding the rank role the quiz is meant for, or no rank role if it isn't a rank quiz."""
+    rank_data = rank_index.rank_by_deck_string.get(quiz_rules.get_deck_string(quiz_data))
+    roles = [SimpleNamespace(id=rank_data["rank_to_have"])] if rank_data else []
+    return SimpleNamespace(id=FAKE_MEMBER_ID, bot=False, mention=f"<@{FAKE_MEMBER_ID}>", roles=roles)
+
+
+#########################################
+
+# Replay
+
+
+async def verify_report(rank_index: levelup_cog.RankIndex, quiz_data):
+    member = build_fake_member(rank_index, quiz_data)
+    user_rank_data = await levelup_cog.verify_if_rank_quiz(member, quiz_data, rank_index)
+    if not user_rank_data:
+        return "not_rank_quiz", None, None
+    validator = rank_index.validator_by_deck_string[user_rank_data["name"]]
+    passed, info = await levelup_cog.verify_quiz_settings(validator, quiz_data, member)
+    return ("passed" if passed else "failed"), user_rank_data["name"], info.strip()
+
+
+async def replay_reports(rank_index: levelup_cog.RankIndex, reports, repeat):
+    results = dict()
+    for quiz_id, quiz_data in reports.items():
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                decision, rank_name, info = await verify_report(rank_index, quiz_data)
+            except (KeyError, IndexError, TypeError) as error:
+                decision, rank_name, info = "error", None, repr(error)
+            durations.append(time.perf_counter() - start)
+        results[quiz_id] = {
+            "decision": decision,
+            "rank": rank_name,
+            "info": info,
+            "latency_seconds": statistics.median(durations),
+        }
+    return results
+
+
+def summarize(results, total_seconds, repeat):
+    latencies = sorted(result["latency_seconds"] for result in results.values())
+
+    def percentile(share):
+        return latencies[min(len(latencies) - 1, int(share * len(latencies)))] if latencies else None
+
+    decisions = dict()
+    for result in results.values():
+        decisions[result["decision"]] = decisions.get(result["decision"], 0) + 1
+    return {
+        "reports": len(results),
+        "decisions": decisions,
+        "reports_per_second": len(results) * repeat / total_seconds if total_seconds else None,
+        "latency_p50": percentile(0.5),
+        "latency_p95": percentile(0.95),
+        "latency_max": latencies[-1] if latencies else None,
+    }
+
+
+def compare_to_expected(results, expected):
+    """Returns the quiz IDs whose decision differs from the expected one."""
+    return {
+        quiz_id: {"expected": expected_decision, "actual": results.get(quiz_id, {}).get("decision")}
+        for quiz_id, expected_decision in expected.items()
+        if results.get(quiz_id, {}).get("decision") != expected_decision
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPOSITORY_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(arguments):
+    with open(arguments.settings) as settings_file:
+        config = yaml.safe_load(settings_file)
+    rank_index = levelup_cog.RankIndex(config["rank_system"]["rank_data"], config["rank_hierarchy"])
+    reports = load_reports(arguments.reports)
+    print(f"QUIZ REPLAY: Replaying {len(reports)} reports from {arguments.reports}.")
+
+    start = time.perf_counter()
+    results = await replay_reports(rank_index, reports, arguments.repeat)
+    total_seconds = time.perf_counter() - start
+
+    report = {
+        "commit": get_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "parameters": {key: value for key, value in vars(arguments).items() if key != "output"},
+        "summary": summarize(results, total_seconds, arguments.repeat),
+        "results": results,
+    }
+
+    exit_code = 0
+    if arguments.expected:
+        with open(arguments.expected) as expected_file:
+            mismatches = compare_to_expected(results, json.load(expected_file))
+        report["mismatches"] = mismatches
+        if mismatches:
+            print(f"QUIZ REPLAY: {len(mismatches)} decisions differ from {arguments.expected}.")
+            exit_code = 1
+
+    if arguments.write_expected:
+        with open(arguments.write_expected, "w") as expected_file:
+            json.dump({quiz_id: result["decision"] for quiz_id, result in results.items()}, expected_file, indent=2)
+        print(f"QUIZ REPLAY: Wrote expected decisions to {arguments.write_expected}")
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            output_file.write(output)
+        print(f"QUIZ REPLAY: Wrote results to {arguments.output}")
+    else:
+        print(output)
+    return exit_code
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Replay recorded Kotoba game reports through the quiz verification.")
+    parser.add_argument("--reports", default="data/kotoba_reports", help="Folder with <quiz_id>.json reports.")
+    parser.add_argument("--settings", default="settings.yml", help="Settings file with rank_system and rank_hierarchy.")
+    parser.add_argument("--repeat", type=int, default=1, help="Verify each report this often and keep the median.")
+    parser.add_argument("--expected", help="JSON file mapping quiz IDs to the expected decision.")
+    parser.add_argument("--write-expected", help="Write the decisions of this run to this file.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_arguments())))
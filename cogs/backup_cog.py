@@ -3,6 +3,7 @@ from discord.ext import commands
 from discord.ext import tasks
 
 from . import data_management
+from . import kotoba_api
 from . import utility_cog
 
 import os
@@ -22,8 +23,14 @@ class BackupData(commands.Cog):
         self.backup_routine.start()
 
     async def get_files_to_upload(self):
+        # Sidecar caches are derived from the data files and game reports can be fetched from Kotoba again.
+        excluded_folders = [
+            os.path.normpath(folder) for folder in (data_management.SIDECAR_FOLDER, kotoba_api.GAME_REPORT_FOLDER)
+        ]
         files = []
         for dirpath, dirnames, filenames in os.walk(BACKUP_DIR):
+            if any(os.path.normpath(dirpath).startswith(folder) for folder in excluded_folders):
+                continue
             for filename in filenames:
                 files.append(os.path.join(dirpath, filename))
 
@@ -49,6 +56,7 @@ class BackupData(commands.Cog):
         application_key = self.bucket_settings["secret-key"]
         b2_api.authorize_account("production", application_key_id, application_key)
 
+        await data_management.flush_data()
         files_to_upload = await self.get_files_to_upload()
         bucket = b2_api.get_bucket_by_name(self.bucket_settings["backup_bucket"])
         for file in files_to_upload:
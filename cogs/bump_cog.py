@@ -49,7 +49,7 @@ async def save_time(bump_bot: discord.Member, bump_data):
     wait_time = timedelta(minutes=BUMP_BOTS[bump_bot.id][2])
     next_bump_time = datetime.utcnow() + wait_time
     bump_data[f"next_bump_time_{BUMP_BOTS[bump_bot.id][0]}"] = next_bump_time
-    await data_management.save_data(bump_data, BUMP_DATA_FILE_NAME)
+    await data_management.set_value(BUMP_DATA_FILE_NAME, f"next_bump_time_{BUMP_BOTS[bump_bot.id][0]}", next_bump_time)
 
 
 async def load_time(bump_bot: discord.Member, bump_data):
@@ -65,22 +65,18 @@ async def load_time(bump_bot: discord.Member, bump_data):
 
 
 async def increment_leaderboard_points(bump_member: discord.Member, bump_data):
-    bump_leaderboard = bump_data.get("leaderboard", {})
-    old_points = bump_leaderboard.get(bump_member.id, 0)
-    new_points = old_points + 1
-    bump_leaderboard[bump_member.id] = new_points
-    await data_management.save_data(bump_data, BUMP_DATA_FILE_NAME)
-    return old_points, new_points
+    new_points = await data_management.increment_value(BUMP_DATA_FILE_NAME, ["leaderboard", bump_member.id])
+    bump_data.setdefault("leaderboard", {})[bump_member.id] = new_points
+    return new_points - 1, new_points
 
 
 #########################################
 
 
 async def make_leaderboard_post(bump_channel: discord.TextChannel, leaderboard_lines):
-    past_pins = await utility_cog.get_past_user_pins(bump_channel, bump_channel.guild.me)
     leaderboard_fields = await utility_cog.create_fields(leaderboard_lines)
     leaderboard_embeds = await utility_cog.create_embeds_from_fields(leaderboard_fields, "Bump Leaderboard")
-    await utility_cog.update_embeds(past_pins, leaderboard_embeds, "Bump Leaderboard", bump_channel)
+    await utility_cog.update_embeds(leaderboard_embeds, "Bump Leaderboard", bump_channel)
 
 
 class BumpReminder(commands.Cog):
@@ -1,6 +1,9 @@
 """Framework for clubs with a role point system and scoreboard"""
-import asyncio
+import bisect
 import os
+import time
+import typing
+import unicodedata
 
 import discord
 from discord.ext import commands
@@ -39,36 +42,128 @@ async def time_period_autocomplete(interaction: discord.Interaction, current_inp
     return possible_period_choices[0:25]
 
 
+WORKS_FILE_ENDING = "_read_works.yml"
+USER_FILE_ENDING = "_user_record.yml"
+
 WORKS_DATA = dict()
 
 
 async def generate_works_data():
     data_folder = "data"
-    works_file_ending = "_read_works.yml"
     for file in os.listdir(data_folder):
-        if file.endswith(works_file_ending):
-            club_prefix = file.replace(works_file_ending, "")
-            WORKS_DATA[club_prefix] = await data_management.load_data(f"{club_prefix}_read_works.yml")
+        if file.endswith(WORKS_FILE_ENDING):
+            club_prefix = file.replace(WORKS_FILE_ENDING, "")
+            WORKS_DATA[club_prefix] = await data_management.load_data(f"{club_prefix}{WORKS_FILE_ENDING}")
+
+
+async def get_works_data(club_prefix):
+    if club_prefix not in WORKS_DATA:
+        WORKS_DATA[club_prefix] = await data_management.load_data(f"{club_prefix}{WORKS_FILE_ENDING}")
+    return WORKS_DATA[club_prefix]
+
+
+# Autocomplete has to answer within 3 seconds, searches stop collecting matches after this many seconds.
+SEARCH_TIME_BUDGET = 0.05
+KATAKANA_TO_HIRAGANA = {code_point: code_point - 0x60 for code_point in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize_search_text(text):
+    """Fold width, case and katakana to hiragana, so "ＲＥＺＥＲＯ" finds "Rezero" and "ひぐらし" finds "ヒグラシ"."""
+    return unicodedata.normalize("NFKC", text).casefold().translate(KATAKANA_TO_HIRAGANA)
+
+
+def get_ngrams(text):
+    """Single characters and character pairs of the text."""
+    return set(text) | {text[index : index + 2] for index in range(len(text) - 1)}
+
+
+class WorksSearchIndex:
+    """Search index over the IDs and names of the works of one club.
+
+    Matches are ranked exact match, then prefix match, then substring match. Prefixes are found by binary search
+    in the sorted search keys, substrings through the n-grams of the query."""
+
+    def __init__(self, works_data):
+        self.search_keys = dict()
+        self.sorted_keys = []
+        self.ngram_index = dict()
+        for work_id, work in works_data.items():
+            self.add_work(work_id, work)
+
+    def add_work(self, work_id, work):
+        self.remove_work(work_id)
+        search_keys = {normalize_search_text(work_id), normalize_search_text(work[0])}
+        self.search_keys[work_id] = search_keys
+        for search_key in search_keys:
+            bisect.insort(self.sorted_keys, (search_key, work_id))
+            for ngram in get_ngrams(search_key):
+                self.ngram_index.setdefault(ngram, set()).add(work_id)
+
+    def remove_work(self, work_id):
+        for search_key in self.search_keys.pop(work_id, ()):
+            del self.sorted_keys[bisect.bisect_left(self.sorted_keys, (search_key, work_id))]
+            for ngram in get_ngrams(search_key):
+                self.ngram_index[ngram].discard(work_id)
+                if not self.ngram_index[ngram]:
+                    del self.ngram_index[ngram]
+
+    def find_prefix_matches(self, query):
+        start = bisect.bisect_left(self.sorted_keys, (query,))
+        for search_key, work_id in self.sorted_keys[start:]:
+            if not search_key.startswith(query):
+                break
+            yield search_key, work_id
+
+    def find_substring_matches(self, query):
+        candidate_sets = sorted((self.ngram_index.get(ngram, set()) for ngram in get_ngrams(query)), key=len)
+        candidates = set.intersection(*candidate_sets) if candidate_sets else set()
+        for work_id in candidates:
+            if any(query in search_key for search_key in self.search_keys[work_id]):
+                yield work_id
+
+    def search(self, query, limit=25, allowed_ids=None, time_budget=SEARCH_TIME_BUDGET):
+        """IDs of the best matching works, optionally only from allowed_ids."""
+        query = normalize_search_text(query)
+        work_ids = self.search_keys if allowed_ids is None else [i for i in allowed_ids if i in self.search_keys]
+        if not query:
+            return list(work_ids)[:limit]
+
+        deadline = time.perf_counter() + time_budget
+        exact_matches, prefix_matches = [], []
+        for search_key, work_id in self.find_prefix_matches(query):
+            if allowed_ids is None or work_id in allowed_ids:
+                (exact_matches if search_key == query else prefix_matches).append(work_id)
+        prefix_matches.sort(key=lambda work_id: min(map(len, self.search_keys[work_id])))
+
+        results = dict.fromkeys(exact_matches + prefix_matches)
+        for work_id in self.find_substring_matches(query):
+            if len(results) >= limit or time.perf_counter() > deadline:
+                break
+            if allowed_ids is None or work_id in allowed_ids:
+                results.setdefault(work_id)
+        return list(results)[:limit]
+
+
+WORKS_SEARCH_INDEX = dict()
+
+
+async def get_works_search_index(club_prefix) -> WorksSearchIndex:
+    if club_prefix not in WORKS_SEARCH_INDEX:
+        WORKS_SEARCH_INDEX[club_prefix] = WorksSearchIndex(await get_works_data(club_prefix))
+    return WORKS_SEARCH_INDEX[club_prefix]
 
 
 async def works_autocomplete(interaction: discord.Interaction, current_input: str):
     challenge_prefix = interaction.namespace.club
-    if not WORKS_DATA:
-        await generate_works_data()
-    work_data = WORKS_DATA[challenge_prefix]
+    work_data = await get_works_data(challenge_prefix)
+    search_index = await get_works_search_index(challenge_prefix)
 
     possible_choices = []
-    for short_id in work_data:
+    for short_id in search_index.search(current_input, limit=13):
         full_name = work_data[short_id][0]
         relevant_period = work_data[short_id][1] + "-" + work_data[short_id][2]
-
-        if current_input.lower() in short_id.lower() or current_input.lower() in full_name.lower():
-            possible_choices.append(
-                discord.app_commands.Choice(name=f"{short_id} ({relevant_period})", value=short_id)
-            )
-            possible_choices.append(
-                discord.app_commands.Choice(name=f"{full_name} ({relevant_period})", value=short_id)
-            )
+        possible_choices.append(discord.app_commands.Choice(name=f"{short_id} ({relevant_period})", value=short_id))
+        possible_choices.append(discord.app_commands.Choice(name=f"{full_name} ({relevant_period})", value=short_id))
 
     return possible_choices[0:25]
 
@@ -78,28 +173,123 @@ USER_DATA = dict()
 
 async def generate_user_data():
     data_folder = "data"
-    user_file_ending = "_user_record.yml"
     for file in os.listdir(data_folder):
-        if file.endswith(user_file_ending):
-            club_prefix = file.replace(user_file_ending, "")
-            USER_DATA[club_prefix] = await data_management.load_data(f"{club_prefix}_user_record.yml")
+        if file.endswith(USER_FILE_ENDING):
+            club_prefix = file.replace(USER_FILE_ENDING, "")
+            USER_DATA[club_prefix] = await data_management.load_data(f"{club_prefix}{USER_FILE_ENDING}")
+
+
+async def get_user_data(club_prefix):
+    if club_prefix not in USER_DATA:
+        USER_DATA[club_prefix] = await data_management.load_data(f"{club_prefix}{USER_FILE_ENDING}")
+    return USER_DATA[club_prefix]
+
+
+def apply_data_change(club_cache, file_ending, change: data_management.DataChange):
+    """Keep a club cache in line with the saved data files. Clubs not cached yet are loaded on first use."""
+    club_prefix = change.file_name[: -len(file_ending)]
+    if club_prefix not in club_cache:
+        return
+    if change.changed is None:
+        del club_cache[club_prefix]
+        return
+    club_cache[club_prefix].update(change.changed)
+    for key in change.removed:
+        club_cache[club_prefix].pop(key, None)
+
+
+def on_works_change(change: data_management.DataChange):
+    apply_data_change(WORKS_DATA, WORKS_FILE_ENDING, change)
+
+    club_prefix = change.file_name[: -len(WORKS_FILE_ENDING)]
+    search_index = WORKS_SEARCH_INDEX.get(club_prefix)
+    if not search_index:
+        return
+    if change.changed is None:
+        del WORKS_SEARCH_INDEX[club_prefix]
+        return
+    for work_id, work in change.changed.items():
+        search_index.add_work(work_id, work)
+    for work_id in change.removed:
+        search_index.remove_work(work_id)
+
+
+class PointsIndex:
+    """Total points per member of one club, kept in a list sorted by descending points for rank lookups."""
+
+    def __init__(self, user_data):
+        self.totals = {user_id: sum(points for _, points in rewards) for user_id, rewards in user_data.items()}
+        self.ranking = sorted((-total, user_id) for user_id, total in self.totals.items())
+
+    def remove_user(self, user_id):
+        if user_id not in self.totals:
+            return
+        entry = (-self.totals.pop(user_id), user_id)
+        del self.ranking[bisect.bisect_left(self.ranking, entry)]
+
+    def update_user(self, user_id, rewards):
+        self.remove_user(user_id)
+        total = sum(points for _, points in rewards)
+        self.totals[user_id] = total
+        bisect.insort(self.ranking, (-total, user_id))
+
+    def get_total(self, user_id):
+        return self.totals.get(user_id, 0)
+
+    def get_rank(self, user_id):
+        """1-based position of the user, shared by everyone with the same points. None for unknown users."""
+        if user_id not in self.totals:
+            return None
+        return bisect.bisect_left(self.ranking, (-self.totals[user_id],)) + 1
+
+    def ranked_totals(self):
+        """(user ID, total points) pairs from the most to the fewest points."""
+        return [(user_id, -negative_total) for negative_total, user_id in self.ranking]
+
+    def __len__(self):
+        return len(self.ranking)
+
+
+POINTS_INDEX = dict()
+
+
+async def get_points_index(club_prefix) -> PointsIndex:
+    if club_prefix not in POINTS_INDEX:
+        POINTS_INDEX[club_prefix] = PointsIndex(await data_management.load_data(f"{club_prefix}{USER_FILE_ENDING}"))
+    return POINTS_INDEX[club_prefix]
+
+
+def on_user_data_change(change: data_management.DataChange):
+    apply_data_change(USER_DATA, USER_FILE_ENDING, change)
+
+    club_prefix = change.file_name[: -len(USER_FILE_ENDING)]
+    points_index = POINTS_INDEX.get(club_prefix)
+    if not points_index:
+        return
+    if change.changed is None:
+        del POINTS_INDEX[club_prefix]
+        return
+    for user_id, rewards in change.changed.items():
+        points_index.update_user(user_id, rewards)
+    for user_id in change.removed:
+        points_index.remove_user(user_id)
 
 
 async def user_works_autocomplete(interaction: discord.Interaction, current_input: str):
     challenge_prefix = interaction.namespace.club
     member = interaction.namespace.member
-    if not USER_DATA:
-        await generate_user_data()
-    all_user_data = USER_DATA[challenge_prefix]
-    if not WORKS_DATA:
-        await generate_works_data()
-    work_data = WORKS_DATA[challenge_prefix]
-    reward_user_data = all_user_data.get(member.id, list())
+    if not member:
+        return []
+    all_user_data = await get_user_data(challenge_prefix)
+    work_data = await get_works_data(challenge_prefix)
+    search_index = await get_works_search_index(challenge_prefix)
+    reward_points = {work_id: points for work_id, points in all_user_data.get(member.id, list())}
     possible_choices = []
-    for work_id, points in reward_user_data:
+    for work_id in search_index.search(current_input, allowed_ids=reward_points):
         work_name, beginning_period, end_period, additional_info = work_data[work_id]
-        if current_input.lower() in work_name.lower() or current_input.lower() in work_id.lower():
-            possible_choices.append(discord.app_commands.Choice(name=f"{work_name} ({points} Points)", value=work_id))
+        possible_choices.append(
+            discord.app_commands.Choice(name=f"{work_name} ({reward_points[work_id]} Points)", value=work_id)
+        )
 
     return possible_choices[0:25]
 
@@ -121,14 +311,11 @@ async def update_leaderboard_pins(guild: discord.Guild, club_prefix, bot):
     club_data = [club for club in clubs_settings if club["club_prefix"] == club_prefix][0]
     club_channel = discord.utils.get(guild.channels, id=club_data["club_channel"])
     club_name = club_data["club_name"]
-    all_user_data = await data_management.load_data(f"{club_prefix}_user_record.yml")
+    points_index = await get_points_index(club_prefix)
 
     leaderboard_lines = []
-    sorted_ids = sorted(all_user_data, key=lambda key: sum(entry[1] for entry in all_user_data[key]), reverse=True)
-
-    for index, user_id in enumerate(sorted_ids):
+    for index, (user_id, member_points) in enumerate(points_index.ranked_totals()):
         member = guild.get_member(user_id)
-        member_points = sum(entry[1] for entry in all_user_data[user_id])
         if not member:
             user_name = await username_cog.get_user_name(bot, user_id)
             if "Deleted User" in user_name:
@@ -137,11 +324,10 @@ async def update_leaderboard_pins(guild: discord.Guild, club_prefix, bot):
         else:
             leaderboard_lines.append(f"{index + 1}. {member.mention} {member_points}点")
 
-    user_pins = await utility_cog.get_past_user_pins(club_channel, guild.me)
     fields = await utility_cog.create_fields(leaderboard_lines)
     embeds = await utility_cog.create_embeds_from_fields(fields, f"{club_name} Leaderboard")
     print(f"CLUBS: Updating {club_name} leaderboard pins.")
-    await utility_cog.update_embeds(user_pins, embeds, f"{club_name} Leaderboard", club_channel)
+    await utility_cog.update_embeds(embeds, f"{club_name} Leaderboard", club_channel)
 
 
 async def update_past_works_pins(guild: discord.Guild, club_prefix, bot):
@@ -161,89 +347,136 @@ async def update_past_works_pins(guild: discord.Guild, club_prefix, bot):
                 f"{index + 1}. **{start_date}-{end_date}** `{work_name}` {extra_info} | ID: `{work_id}`"
             )
 
-    user_pins = await utility_cog.get_past_user_pins(club_channel, guild.me)
     fields = await utility_cog.create_fields(past_works_lines)
     embeds = await utility_cog.create_embeds_from_fields(fields, f"{club_name} Past Works")
     print(f"CLUBS: Updating {club_name} past works pins.")
-    await utility_cog.update_embeds(user_pins, embeds, f"{club_name} Past Works", club_channel)
+    await utility_cog.update_embeds(embeds, f"{club_name} Past Works", club_channel)
 
 
 #########################################
 
 
-async def give_out_reward_roles(bot: commands.Bot, guild: discord.Guild, club_prefix: str):
-    clubs_data = clubs_settings
-    club_data = [club for club in clubs_data if club["club_prefix"] == club_prefix][0]
-    club_name = club_data["club_name"]
+# Member edits, role creations and deletions for club roles are paced to one per second.
+ROLE_EDITS_PER_SECOND = 1
+role_edit_limiter = utility_cog.RateLimiter(ROLE_EDITS_PER_SECOND, 1)
+
+
+def add_to_role_plan(role_plan, member: discord.Member, managed_roles, desired_roles):
+    """Plan to give the member exactly desired_roles out of managed_roles."""
+    current_roles = {role for role in member.roles if role in managed_roles}
+    if current_roles == desired_roles:
+        return
+    roles_to_add, roles_to_remove = role_plan.setdefault(member, (set(), set()))
+    roles_to_add.update(desired_roles - current_roles)
+    roles_to_remove.update(current_roles - desired_roles)
+
+
+async def plan_reward_roles(guild: discord.Guild, club_prefix, role_plan):
+    """Add the point role changes of a club to role_plan. Missing point roles are created."""
+    club_data = [club for club in clubs_settings if club["club_prefix"] == club_prefix][0]
     reward_role_suffix = club_data["point_suffix"]
-    user_data = await data_management.load_data(f"{club_prefix}_user_record.yml")
+    reward_roles_by_name = {role.name: role for role in guild.roles if role.name.endswith(reward_role_suffix)}
+    points_index = await get_points_index(club_prefix)
 
-    for member_id in user_data:
+    for member_id, total_points in points_index.ranked_totals():
         member = guild.get_member(member_id)
-        if not member:
-            continue
-        total_points = sum([reward_data[1] for reward_data in user_data[member_id]])
-        if total_points == 0:
+        if not member or total_points == 0:
             continue
 
         role_name = f"{total_points}{reward_role_suffix}"
-        reward_role = discord.utils.get(guild.roles, name=role_name)
-        if not reward_role:
+        if role_name not in reward_roles_by_name:
             print(f"CLUBS: Creating nonexistent role {role_name}")
-            reward_role = await guild.create_role(name=role_name, colour=discord.Colour.dark_grey())
-
-        other_reward_roles = [
-            role for role in guild.roles if role.name.endswith(reward_role_suffix) and role is not reward_role
-        ]
-
-        if reward_role in member.roles:
-            continue
-        else:
-            await asyncio.sleep(5)
-            await member.remove_roles(*other_reward_roles)
-            print(f"CLUBS: Giving {member} the {reward_role.name} role for the {club_name}")
-            await asyncio.sleep(5)
-            await member.add_roles(reward_role)
-
-    # Role cleanup
-    roles_to_delete = [
-        role for role in guild.roles if role.name.endswith(reward_role_suffix) and len(role.members) == 0
-    ]
-    for role in roles_to_delete:
-        print(f"CLUBS: Deleting role {role.name} as it has no members.")
-        await asyncio.sleep(5)
-        await role.delete(reason="No members for role.")
+            await role_edit_limiter.wait()
+            reward_roles_by_name[role_name] = await guild.create_role(
+                name=role_name, colour=discord.Colour.dark_grey()
+            )
+        add_to_role_plan(role_plan, member, set(reward_roles_by_name.values()), {reward_roles_by_name[role_name]})
+    return list(reward_roles_by_name.values())
 
 
-async def give_out_checkpoint_roles(bot: commands.Bot, guild: discord.Guild, club_prefix):
-    clubs_data = clubs_settings
-    club_data = [club for club in clubs_data if club["club_prefix"] == club_prefix][0]
+async def plan_checkpoint_roles(guild: discord.Guild, club_prefix, role_plan):
+    """Add the checkpoint role changes of a club to role_plan."""
+    club_data = [club for club in clubs_settings if club["club_prefix"] == club_prefix][0]
     checkpoint_role_data = club_data.get("check_point_roles")
     if not checkpoint_role_data:
         return
 
-    all_checkpoint_roles = [discord.utils.get(guild.roles, id=role_id) for _, role_id in checkpoint_role_data.items()]
-    user_data = await data_management.load_data(f"{club_prefix}_user_record.yml")
+    thresholds = sorted(
+        (needed_points, guild.get_role(role_id))
+        for needed_points, role_id in checkpoint_role_data.items()
+        if guild.get_role(role_id)
+    )
+    needed_points = [points for points, _ in thresholds]
+    all_checkpoint_roles = {role for _, role in thresholds}
+    points_index = await get_points_index(club_prefix)
 
-    for user_id in user_data:
+    for user_id, total_points in points_index.ranked_totals():
         member = guild.get_member(int(user_id))
-        if not member:
+        threshold_position = bisect.bisect_right(needed_points, total_points)
+        if not member or threshold_position == 0:
             continue
-        total_points = sum([reward_data[1] for reward_data in user_data[user_id]])
+        add_to_role_plan(role_plan, member, all_checkpoint_roles, {thresholds[threshold_position - 1][1]})
 
-        role_to_give = None
-        for needed_points, role_id in checkpoint_role_data.items():
-            if total_points >= needed_points:
-                role_to_give = discord.utils.get(guild.roles, id=role_id)
-                break
-        if role_to_give:
-            if role_to_give in member.roles:
-                continue
-            print(f"CLUBS: Giving {role_to_give.name} to {member}.")
-            await asyncio.sleep(5)
-            await member.remove_roles(*all_checkpoint_roles)
-            await asyncio.sleep(5)
-            await member.add_roles(role_to_give)
+
+async def apply_role_plan(role_plan, reason):
+    """Apply each member's planned changes with a single edit. Returns the plan of the members that were updated."""
+    applied_plan = dict()
+    for member, (roles_to_add, roles_to_remove) in role_plan.items():
+        await role_edit_limiter.wait()
+        # Built after the wait, so role changes made while waiting for the rate limit are kept.
+        new_roles = [role for role in member.roles if not role.is_default() and role not in roles_to_remove]
+        new_roles.extend(role for role in roles_to_add if role not in new_roles)
+        try:
+            await member.edit(roles=new_roles, reason=reason)
+        except discord.HTTPException as error:
+            print(f"CLUBS: Failed to update the roles of {member}: {error}")
+            continue
+        added_names = ", ".join(role.name for role in roles_to_add)
+        removed_names = ", ".join(role.name for role in roles_to_remove)
+        print(f"CLUBS: Updated the roles of {member} (added: {added_names or '-'}, removed: {removed_names or '-'})")
+        applied_plan[member] = (roles_to_add, roles_to_remove)
+    return applied_plan
+
+
+async def delete_empty_roles(roles, role_plan):
+    """Delete roles that have no members left after the applied role_plan."""
+    member_counts = {role: len(role.members) for role in roles}
+    for roles_to_add, roles_to_remove in role_plan.values():
+        for role in roles_to_add & member_counts.keys():
+            member_counts[role] += 1
+        for role in roles_to_remove & member_counts.keys():
+            member_counts[role] -= 1
+
+    for role, member_count in member_counts.items():
+        if member_count <= 0:
+            print(f"CLUBS: Deleting role {role.name} as it has no members.")
+            await role_edit_limiter.wait()
+            await role.delete(reason="No members for role.")
+
+
+async def reconcile_club_roles(guild: discord.Guild, club_prefix, reward_roles=True, checkpoint_roles=True):
+    """Plan the point and checkpoint roles of all club members first, then apply one edit per changed member."""
+    club_name = [club for club in clubs_settings if club["club_prefix"] == club_prefix][0]["club_name"]
+    role_plan = dict()
+    reward_role_list = []
+    if reward_roles:
+        reward_role_list = await plan_reward_roles(guild, club_prefix, role_plan)
+    if checkpoint_roles:
+        await plan_checkpoint_roles(guild, club_prefix, role_plan)
+
+    applied_plan = await apply_role_plan(role_plan, f"{club_name} points")
+    print(f"CLUBS: Planned role changes for {len(role_plan)} members in the {club_name}, applied {len(applied_plan)}.")
+    # Failed edits are left out, so a role is only deleted if its members really lost it.
+    await delete_empty_roles(reward_role_list, applied_plan)
+    return len(role_plan), len(applied_plan)
+
+
+async def give_out_reward_roles(bot: commands.Bot, guild: discord.Guild, club_prefix: str):
+    return await reconcile_club_roles(guild, club_prefix, checkpoint_roles=False)
+
+
+async def give_out_checkpoint_roles(bot: commands.Bot, guild: discord.Guild, club_prefix):
+    return await reconcile_club_roles(guild, club_prefix, reward_roles=False)
 
 
 #########################################
@@ -286,8 +519,19 @@ class Clubs(commands.Cog):
         clubs_settings = self.bot.config["clubs"]
 
     async def cog_load(self):
+        data_management.subscribe(f"*{WORKS_FILE_ENDING}", on_works_change)
+        data_management.subscribe(f"*{USER_FILE_ENDING}", on_user_data_change)
+        # Autocomplete must not be the first to load the club data.
+        await generate_works_data()
+        await generate_user_data()
+        for club_prefix in WORKS_DATA:
+            await get_works_search_index(club_prefix)
         self.club_updates.start()
 
+    async def cog_unload(self):
+        data_management.unsubscribe(on_works_change)
+        data_management.unsubscribe(on_user_data_change)
+
     async def check_if_club_manager(self, member, club_prefix):
         club_data = [club for club in self.clubs_settings if club["club_prefix"] == club_prefix][0]
         club_manager_role = discord.utils.get(self.guild.roles, id=club_data["manager_role"])
@@ -360,8 +604,6 @@ class Clubs(commands.Cog):
             f"`{beginning_period}` to `{end_period}` with the unique ID "
             f"`{short_id}` to the `{club['club_name']}`."
         )
-        await asyncio.sleep(5)
-        await generate_works_data()
 
     @discord.app_commands.command(name="remove_work", description="Remove a work from a club.")
     @discord.app_commands.describe(club="Name or shorthand of the club", short_id="ID of the work to remove.")
@@ -382,8 +624,6 @@ class Clubs(commands.Cog):
         del work_data[short_id]
         await data_management.save_data(work_data, f"{club}_read_works.yml")
         await interaction.response.send_message(f"Removed work with ID `{short_id}` from the `{club}`.")
-        await asyncio.sleep(5)
-        await generate_works_data()
 
     @discord.app_commands.command(name="reward_work", description="Rewards a work to a user.")
     @discord.app_commands.describe(
@@ -411,11 +651,10 @@ class Clubs(commands.Cog):
             return
         full_work_name = work_data[work_name][0]
         user_data = await data_management.load_data(f"{club}_user_record.yml")
+        points_index = await get_points_index(club)
+        old_total_points = points_index.get_total(member.id)
         if member.id not in user_data:
             user_data[member.id] = list()
-            old_total_points = 0
-        else:
-            old_total_points = sum([reward_data[1] for reward_data in user_data[member.id]])
 
         for work_id, saved_points in user_data[member.id]:
             if work_id == work_name:
@@ -459,7 +698,8 @@ class Clubs(commands.Cog):
             return
 
         current_user_data = user_data[member.id]
-        old_total_points = sum([reward_data[1] for reward_data in current_user_data])
+        points_index = await get_points_index(club)
+        old_total_points = points_index.get_total(member.id)
         for index, (work_id, points) in enumerate(current_user_data):
             if work_id == work_name:
                 del current_user_data[index]
@@ -471,6 +711,27 @@ class Clubs(commands.Cog):
             f"Unrewarded work with ID `{work_name}` ({full_work_name}) from user {member.mention} in the `{club}` bringing their total points from `{old_total_points}` to `{new_total_points}`."
         )
 
+    @discord.app_commands.command(name="club_rank", description="See the leaderboard position of a user in a club.")
+    @discord.app_commands.describe(
+        club="Name or shorthand of the club.", member="The user to get the position for. Defaults to you."
+    )
+    @discord.app_commands.autocomplete(club=clubs_autocomplete)
+    async def club_rank(self, interaction: discord.Interaction, club: str, member: typing.Optional[discord.Member]):
+        club_data = [club_data for club_data in self.clubs_settings if club_data["club_prefix"] == club][0]
+        member = member or interaction.user
+        points_index = await get_points_index(club)
+        rank = points_index.get_rank(member.id)
+        if rank is None:
+            await interaction.response.send_message(
+                f"User `{member}` does not have any works rewarded to them in the `{club}`.", ephemeral=True
+            )
+            return
+        await interaction.response.send_message(
+            f"{member.mention} is ranked **#{rank}** of {len(points_index)} in the {club_data['club_name']} "
+            f"with {points_index.get_total(member.id)} points.",
+            allowed_mentions=discord.AllowedMentions.none(),
+        )
+
     @discord.app_commands.command(name="get_user_works", description="Get the list of works the user read/watched.")
     @discord.app_commands.describe(club="Name or shorthand of the club.", member="The user to get the works for.")
     @discord.app_commands.autocomplete(club=clubs_autocomplete)
@@ -536,8 +797,7 @@ class Clubs(commands.Cog):
             club_prefix = club["club_prefix"]
             await update_leaderboard_pins(self.guild, club_prefix, self.bot)
             await update_past_works_pins(self.guild, club_prefix, self.bot)
-            await give_out_reward_roles(self.bot, self.guild, club_prefix)
-            await give_out_checkpoint_roles(self.bot, self.guild, club_prefix)
+            await reconcile_club_roles(self.guild, club_prefix)
 
 
 async def setup(bot):
@@ -1,27 +1,512 @@
 import yaml
 import asyncio
+import collections
+import contextlib
+import copy
+import fnmatch
+import os
+import pickle
 
-data_lock = asyncio.Lock()
+from . import sqlite_storage
 
+# Use the LibYAML bindings when PyYAML was built with them.
+try:
+    from yaml import CSafeLoader as SafeLoader
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader
+    from yaml import Dumper
 
-async def load_data(file_name, return_list=False):
-    def load():
+# Parsed documents are kept in memory and written back to disk in the background.
+DEFAULT_FLUSH_INTERVAL = 60
+
+data_cache = dict()
+# Maps a file name to the keys changed and removed since the last flush, or None if the whole file has to be written.
+dirty_files = dict()
+flush_task = None
+
+# Small updates are appended to a journal per file and folded into the base file once it grows too large.
+JOURNAL_COMPACT_SIZE = 64 * 1024
+# Maps a file name to the top-level keys changed through the journal since the base file was written.
+journaled_keys = dict()
+# Every journal starts with its generation. The base file records the generation it has absorbed, so a journal
+# left behind by a crash during compaction is recognized and not replayed twice.
+JOURNAL_GENERATION_KEY = "_journal_generation"
+journal_generations = dict()
+
+# Every file has its own lock so slow I/O on one file does not block the others.
+file_locks = dict()
+pending_loads = dict()
+
+
+SIDECAR_FOLDER = "data/.cache"
+
+
+def get_sidecar_path(file_path):
+    return os.path.join(SIDECAR_FOLDER, os.path.normpath(file_path).replace(os.sep, "_") + ".pickle")
+
+
+def write_sidecar(file_path, data):
+    """Store the parsed document keyed by the modification time and size of its YAML file."""
+    file_stat = os.stat(file_path)
+    sidecar_path = get_sidecar_path(file_path)
+    os.makedirs(SIDECAR_FOLDER, exist_ok=True)
+    with open(sidecar_path + ".tmp", "wb") as sidecar_file:
+        pickle.dump((file_stat.st_mtime_ns, file_stat.st_size, data), sidecar_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+
+
+def read_sidecar(file_path, file_stat):
+    try:
+        with open(get_sidecar_path(file_path), "rb") as sidecar_file:
+            mtime_ns, size, data = pickle.load(sidecar_file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None, False
+    if mtime_ns != file_stat.st_mtime_ns or size != file_stat.st_size:
+        return None, False
+    return data, True
+
+
+def load_yaml_file(file_path, use_sidecar=True):
+    """Parse a YAML file, skipping the parser if the sidecar cache is still current. Blocking.
+
+    Files that are rarely read again, like snapshots, should pass use_sidecar=False."""
+    if use_sidecar:
+        data, is_current = read_sidecar(file_path, os.stat(file_path))
+        if is_current:
+            return data
+
+    with open(file_path) as file:
+        data = yaml.load(file, Loader=SafeLoader)
+    if not use_sidecar:
+        return data
+    try:
+        write_sidecar(file_path, data)
+    except OSError as error:
+        print(f"DATA MANAGEMENT: Failed to write cache for {file_path}: {error}")
+    return data
+
+
+def dump_yaml_file(data, file_path, use_sidecar=True):
+    """Atomically write a YAML file and refresh its sidecar cache. Blocking."""
+    # Dump to a temporary file first so a crash mid-dump can't leave a truncated file behind.
+    with open(file_path + ".tmp", "w") as file:
+        yaml.dump(data, file, Dumper=Dumper)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(file_path + ".tmp", file_path)
+    if not use_sidecar:
+        return
+    try:
+        write_sidecar(file_path, data)
+    except OSError as error:
+        print(f"DATA MANAGEMENT: Failed to write cache for {file_path}: {error}")
+
+
+class ReadWriteLock:
+    """Allows many readers or a single writer at a time. Waiting writers block new readers."""
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    @contextlib.asynccontextmanager
+    async def read(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writing and not self.waiting_writers)
+            self.readers += 1
         try:
-            with open(f"data/{file_name}") as file:
-                return yaml.safe_load(file)
-        except FileNotFoundError:
-            return [] if return_list else {}
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def write(self):
+        async with self.condition:
+            self.waiting_writers += 1
+            try:
+                await self.condition.wait_for(lambda: not self.writing and not self.readers)
+            finally:
+                self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+def get_file_lock(file_name):
+    if file_name not in file_locks:
+        file_locks[file_name] = ReadWriteLock()
+    return file_locks[file_name]
+
+
+class YamlStorage:
+    """Stores every document as a YAML file in the data folder."""
+
+    async def read(self, file_name, return_list=False):
+        def load():
+            try:
+                return load_yaml_file(f"data/{file_name}")
+            except FileNotFoundError:
+                return [] if return_list else {}
 
-    async with data_lock:
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(None, load)
 
+    async def write(self, file_name, data, changed_keys=None, removed_keys=None):
+        def save():
+            dump_yaml_file(data, f"data/{file_name}")
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, save)
+
+    async def close(self):
+        pass
+
+
+storage = YamlStorage()
+
+
+def setup_storage(data_settings):
+    """Select the storage backend from the data_management settings."""
+    global storage
+    if data_settings.get("storage", "yaml") == "sqlite":
+        storage = sqlite_storage.SqliteStorage(data_settings.get("sqlite_database", sqlite_storage.DEFAULT_DATABASE))
+    else:
+        storage = YamlStorage()
+
+    global JOURNAL_COMPACT_SIZE
+    JOURNAL_COMPACT_SIZE = data_settings.get("journal_compact_bytes", JOURNAL_COMPACT_SIZE)
+
+
+async def read_file(file_name, return_list=False):
+    async with get_file_lock(file_name).read():
+        data = await storage.read(file_name, return_list)
+        has_generation = isinstance(data, dict) and JOURNAL_GENERATION_KEY in data
+        base_generation = data.pop(JOURNAL_GENERATION_KEY) if has_generation else 0
+        loop = asyncio.get_running_loop()
+        journal_generation, journal_entries = await loop.run_in_executor(None, read_journal, file_name)
+        if journal_generation is not None and journal_generation <= base_generation:
+            # Compaction wrote the base file but stopped before removing the journal.
+            await loop.run_in_executor(None, remove_journal, file_name)
+            journal_generation, journal_entries = None, []
+    if journal_entries or has_generation:
+        journal_generations[file_name] = journal_generation or base_generation + 1
+    for operation, keys, value in journal_entries:
+        data = apply_change(data, operation, keys, value)
+        journaled_keys.setdefault(file_name, set()).add(keys[0])
+    data_cache.setdefault(file_name, data)
+
+
+async def write_file(file_name):
+    async with get_file_lock(file_name).write():
+        changes = dirty_files.pop(file_name, ((), ()))
+        changed_keys, removed_keys = changes if changes else (None, None)
+        if changed_keys is not None:
+            changed_keys = set(changed_keys) | journaled_keys.get(file_name, set())
+        # Entries are replaced rather than mutated, so a shallow copy is a stable snapshot for the worker thread.
+        data = copy.copy(data_cache[file_name])
+        journal_generation = journal_generations.get(file_name)
+        if journal_generation is not None and isinstance(data, dict):
+            data[JOURNAL_GENERATION_KEY] = journal_generation
+            if changed_keys is not None:
+                changed_keys.add(JOURNAL_GENERATION_KEY)
+        try:
+            await storage.write(file_name, data, changed_keys, removed_keys)
+        except Exception:
+            mark_dirty(file_name)
+            raise
+
+        # The base file now contains every journaled change.
+        journaled_keys.pop(file_name, None)
+        if journal_generation is not None:
+            journal_generations[file_name] = journal_generation + 1
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, remove_journal, file_name)
+
+
+async def ensure_loaded(file_name, return_list=False):
+    if file_name not in data_cache:
+        # Concurrent loads of the same file wait for the one read already in flight.
+        if file_name not in pending_loads:
+            pending_loads[file_name] = asyncio.ensure_future(read_file(file_name, return_list))
+            pending_loads[file_name].add_done_callback(lambda _: pending_loads.pop(file_name, None))
+        await asyncio.shield(pending_loads[file_name])
+
+
+def mark_dirty(file_name, changed_keys=None, removed_keys=None):
+    if changed_keys is None and removed_keys is None:
+        dirty_files[file_name] = None
+    elif file_name not in dirty_files:
+        dirty_files[file_name] = (set(changed_keys or ()), set(removed_keys or ()))
+    elif dirty_files[file_name] is not None:
+        pending_changed, pending_removed = dirty_files[file_name]
+        pending_changed.difference_update(removed_keys or ())
+        pending_changed.update(changed_keys or ())
+        pending_removed.difference_update(changed_keys or ())
+        pending_removed.update(removed_keys or ())
+
+
+def diff_keys(old_data, new_data):
+    """Return the keys that changed and were removed between two versions of a mapping."""
+    missing = object()
+    changed_keys = [key for key, value in new_data.items() if old_data.get(key, missing) != value]
+    removed_keys = [key for key in old_data if key not in new_data]
+    return changed_keys, removed_keys
+
+
+async def load_data(file_name, return_list=False):
+    await ensure_loaded(file_name, return_list)
+    return copy.deepcopy(data_cache[file_name])
+
 
 async def save_data(data, file_name):
-    def save():
-        with open(f"data/{file_name}", "w") as file:
-            yaml.dump(data, file)
+    old_data = data_cache.get(file_name)
+    data_cache[file_name] = copy.deepcopy(data)
+    if isinstance(old_data, dict) and isinstance(data, dict):
+        changed_keys, removed_keys = diff_keys(old_data, data)
+        mark_dirty(file_name, changed_keys, removed_keys)
+        publish_change(file_name, changed_keys, removed_keys)
+    else:
+        mark_dirty(file_name)
+        publish_change(file_name)
+
+
+async def load_value(file_name, key, default=None):
+    """Load a single entry of a mapping file without copying the whole document.
 
-    async with data_lock:
+    If the file isn't cached and the storage can read single keys, only that entry is read. Files with a journal
+    are loaded completely, as the journal may change the entry."""
+    read_value = getattr(storage, "read_value", None)
+    if read_value and file_name not in data_cache and file_name not in pending_loads:
+        async with get_file_lock(file_name).read():
+            if not os.path.exists(get_journal_path(file_name)):
+                return await read_value(file_name, key, default)
+    await ensure_loaded(file_name)
+    return copy.deepcopy(data_cache[file_name].get(key, default))
+
+
+async def save_value(file_name, key, value):
+    """Insert or update a single entry of a mapping file."""
+    await ensure_loaded(file_name)
+    data_cache[file_name][key] = copy.deepcopy(value)
+    mark_dirty(file_name, changed_keys=[key])
+    publish_change(file_name, [key], [])
+
+
+async def flush_data():
+    """Write all changed documents to disk."""
+    results = await asyncio.gather(*[write_file(file_name) for file_name in list(dirty_files)], return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+#########################################
+
+# Change notifications
+
+DataChange = collections.namedtuple("DataChange", ["file_name", "changed", "removed"])
+DataChange.__doc__ = """changed maps changed top-level keys to their new values, removed lists deleted keys.
+changed is None if the whole document was replaced and has to be reloaded."""
+
+subscribers = []
+
+
+def subscribe(file_pattern, callback):
+    """Call callback with a DataChange whenever a data file matching the glob pattern changes.
+    Coroutine callbacks are scheduled as tasks."""
+    subscribers.append((file_pattern, callback))
+
+
+def unsubscribe(callback):
+    subscribers[:] = [(pattern, subscriber) for pattern, subscriber in subscribers if subscriber is not callback]
+
+
+def publish_change(file_name, changed_keys=None, removed_keys=None):
+    matching_callbacks = [callback for pattern, callback in subscribers if fnmatch.fnmatchcase(file_name, pattern)]
+    if not matching_callbacks:
+        return
+
+    if changed_keys is None:
+        change = DataChange(file_name, None, [])
+    else:
+        data = data_cache[file_name]
+        change = DataChange(file_name, {key: copy.deepcopy(data[key]) for key in changed_keys}, list(removed_keys))
+
+    for callback in matching_callbacks:
+        try:
+            result = callback(change)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+        except Exception as error:
+            print(f"DATA MANAGEMENT: Change subscriber for {file_name} failed: {error}")
+
+
+#########################################
+
+# Journal for counters and single values
+
+
+def get_journal_path(file_name):
+    return f"data/{file_name}.journal"
+
+
+def read_journal(file_name):
+    """Return the generation and the journaled changes of a file in order. Stops at a line cut off by a crash.
+    Blocking."""
+    journal_generation = None
+    journal_entries = []
+    try:
+        with open(get_journal_path(file_name)) as journal_file:
+            for line in journal_file:
+                try:
+                    operation, keys, value = yaml.load(line, Loader=SafeLoader)
+                except (yaml.YAMLError, TypeError, ValueError):
+                    break
+                if operation == "generation":
+                    journal_generation = value
+                else:
+                    journal_entries.append((operation, keys, value))
+    except FileNotFoundError:
+        pass
+    return journal_generation, journal_entries
+
+
+class JournalDumper(Dumper):
+    """Keeps every journal entry on a single line by escaping line breaks in strings."""
+
+
+JournalDumper.add_representer(
+    str,
+    lambda dumper, value: dumper.represent_scalar(
+        "tag:yaml.org,2002:str", value, style='"' if "\n" in value or "\r" in value else None
+    ),
+)
+
+
+def append_journal(file_name, changes, journal_generation):
+    """Append changes to the journal, one line each, and return the new journal size. Blocking."""
+    lines = [
+        yaml.dump([operation, keys, value], Dumper=JournalDumper, default_flow_style=True, width=2**31 - 1)
+        for operation, keys, value in changes
+    ]
+    with open(get_journal_path(file_name), "a") as journal_file:
+        if journal_file.tell() == 0:
+            lines.insert(0, yaml.dump(["generation", [], journal_generation], Dumper=Dumper, default_flow_style=True))
+        journal_file.write("".join(lines))
+        return journal_file.tell()
+
+
+def remove_journal(file_name):
+    try:
+        os.remove(get_journal_path(file_name))
+    except FileNotFoundError:
+        pass
+
+
+def apply_change(data, operation, keys, value):
+    """Apply a journaled change. Nested mappings on the path are copied instead of mutated."""
+    key = keys[0]
+    if len(keys) > 1:
+        data[key] = apply_change(copy.copy(data.get(key, {})), operation, keys[1:], value)
+    elif operation == "increment":
+        data[key] = data.get(key, 0) + value
+    elif operation == "set":
+        data[key] = value
+    elif operation == "delete":
+        data.pop(key, None)
+    return data
+
+
+async def journal_changes(file_name, changes):
+    """Apply (operation, keys, value) changes to the cached document and append them to the journal in one write.
+    Returns the changed entries."""
+    changes = [
+        (operation, list(keys) if isinstance(keys, (list, tuple)) else [keys], value)
+        for operation, keys, value in changes
+    ]
+    await ensure_loaded(file_name)
+
+    async with get_file_lock(file_name).write():
+        changed_entries = []
+        for operation, keys, value in changes:
+            entry = apply_change(data_cache[file_name], operation, keys, copy.deepcopy(value))
+            for key in keys:
+                entry = entry.get(key) if isinstance(entry, dict) else None
+            changed_entries.append(copy.deepcopy(entry))
+        top_level_keys = {keys[0] for _, keys, _ in changes}
+        journaled_keys.setdefault(file_name, set()).update(top_level_keys)
         loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, save)
+        journal_generation = journal_generations.setdefault(file_name, 1)
+        journal_size = await loop.run_in_executor(None, append_journal, file_name, changes, journal_generation)
+
+    publish_change(
+        file_name,
+        [key for key in top_level_keys if key in data_cache[file_name]],
+        [key for key in top_level_keys if key not in data_cache[file_name]],
+    )
+
+    if journal_size > JOURNAL_COMPACT_SIZE and file_name not in dirty_files:
+        mark_dirty(file_name, changed_keys=())
+        asyncio.ensure_future(compact_journal(file_name))
+    return changed_entries
+
+
+async def compact_journal(file_name):
+    try:
+        await write_file(file_name)
+        print(f"DATA MANAGEMENT: Compacted journal of {file_name}")
+    except Exception as error:
+        print(f"DATA MANAGEMENT: Failed to compact journal of {file_name}: {error}")
+
+
+async def increment_value(file_name, keys, amount=1):
+    """Add to a counter. keys is a single key or a list of nested keys. Returns the new value."""
+    (new_value,) = await journal_changes(file_name, [("increment", keys, amount)])
+    return new_value
+
+
+async def increment_values(file_name, amounts):
+    """Add to several counters with a single journal write. amounts maps keys to the amount to add."""
+    return await journal_changes(file_name, [("increment", keys, amount) for keys, amount in amounts.items()])
+
+
+async def set_value(file_name, keys, value):
+    """Set a single, possibly nested, entry through the journal."""
+    await journal_changes(file_name, [("set", keys, value)])
+
+
+async def delete_value(file_name, keys):
+    """Delete a single, possibly nested, entry through the journal."""
+    await journal_changes(file_name, [("delete", keys, None)])
+
+
+async def flush_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_data()
+        except Exception as error:
+            print(f"DATA MANAGEMENT: Failed to flush data: {error}")
+
+
+def start_flush_loop(interval=DEFAULT_FLUSH_INTERVAL):
+    global flush_task
+    if flush_task and not flush_task.done():
+        return
+    flush_task = asyncio.get_running_loop().create_task(flush_loop(interval))
+
+
+async def stop_flush_loop():
+    if flush_task:
+        flush_task.cancel()
+    await flush_data()
+    await storage.close()
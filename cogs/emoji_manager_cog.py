@@ -1,34 +1,321 @@
 """Create and backup emoji"""
+import array
 import asyncio
+import collections
 import os
 import re
-import shutil
+import sys
+import time
+import typing
+import urllib.parse
+import zipfile
+from datetime import datetime
 
 import discord
 from discord.ext import commands
+from discord.ext import tasks
 
 from . import data_management
 from . import utility_cog
 
 #########################################
 
-increment_lock = asyncio.Lock()
-
-#########################################
-
 # Database Operations and Values
 
 EMOJI_STATS_FILENAME = "emoji_stats.yml"
+EMOJI_NAMES_FILENAME = "emoji_names.yml"
+EMOJI_HISTORY_FILENAME = "emoji_history.yml"
+
+# Matches static <:name:id> and animated <a:name:id> custom emoji and captures the ID.
+EMOJI_PATTERN = re.compile(r"<a?:\w+:(\d+)>")
+
+# Usage counts are buffered in memory and written every EMOJI_FLUSH_SECONDS or every EMOJI_FLUSH_EVENTS uses.
+EMOJI_FLUSH_SECONDS = 60
+EMOJI_FLUSH_EVENTS = 200
+
+EMOJI_BACKUP_FOLDER = "data/emoji_backup"
+EMOJI_BACKUP_ZIP = "data/emoji_backup.zip"
+EMOJI_BACKUP_STATS = "data/emoji_backup_stats.yml"
+# Maps emoji IDs to the backup file downloaded for them.
+EMOJI_BACKUP_FILES_FILENAME = "emoji_backup_files.yml"
+EMOJI_DOWNLOAD_CONCURRENCY = 4
+EMOJI_DOWNLOAD_ATTEMPTS = 5
+EMOJI_UPLOAD_ATTEMPTS = 5
+EMOJI_FILE_EXTENSIONS = (".png", ".gif", ".webp")
+# Minimum seconds between edits of the restore status message.
+RESTORE_STATUS_INTERVAL = 5
+
+# Days of daily usage counts kept per emoji.
+HISTORY_DAYS = 365
+MAX_DAILY_COUNT = 65535
+# The history is kept in memory and written at most this often and whenever the day changes.
+HISTORY_SAVE_SECONDS = 60 * 60
 
 #########################################
 
 
+def get_today():
+    return datetime.utcnow().date().toordinal()
+
+
+class UsageHistory:
+    """Daily usage counts of one emoji for the last HISTORY_DAYS days.
+
+    The counts live in a fixed size array used as a ring buffer indexed by the day ordinal,
+    so the stored size never grows and window sums run over array slices. They are stored little-endian."""
+
+    def __init__(self, last_day=None, counts=None):
+        self.last_day = last_day if last_day is not None else get_today()
+        self.counts = array.array("H")
+        if counts:
+            self.counts.frombytes(counts)
+            if sys.byteorder == "big":
+                self.counts.byteswap()
+        else:
+            self.counts.frombytes(bytes(self.counts.itemsize * HISTORY_DAYS))
+
+    def to_data(self):
+        counts = self.counts
+        if sys.byteorder == "big":
+            counts = array.array("H", counts)
+            counts.byteswap()
+        return [self.last_day, counts.tobytes()]
+
+    def slice_total(self, first_day, last_day):
+        first_index, last_index = first_day % HISTORY_DAYS, last_day % HISTORY_DAYS
+        if first_index <= last_index:
+            return sum(self.counts[first_index : last_index + 1])
+        return sum(self.counts[first_index:]) + sum(self.counts[: last_index + 1])
+
+    def advance(self, today):
+        """Clear the slots of the days passed since the last update."""
+        if today <= self.last_day:
+            return
+        if today - self.last_day >= HISTORY_DAYS:
+            self.counts[:] = array.array("H", bytes(self.counts.itemsize * HISTORY_DAYS))
+        else:
+            first_index, last_index = (self.last_day + 1) % HISTORY_DAYS, today % HISTORY_DAYS
+            if first_index <= last_index:
+                self.counts[first_index : last_index + 1] = array.array("H", [0] * (last_index - first_index + 1))
+            else:
+                self.counts[first_index:] = array.array("H", [0] * (HISTORY_DAYS - first_index))
+                self.counts[: last_index + 1] = array.array("H", [0] * (last_index + 1))
+        self.last_day = today
+
+    def add(self, today, amount):
+        self.advance(today)
+        index = today % HISTORY_DAYS
+        self.counts[index] = min(MAX_DAILY_COUNT, self.counts[index] + amount)
+
+    def total(self, today, days):
+        """Uses in the last days days including today."""
+        first_day = max(today - days + 1, self.last_day - HISTORY_DAYS + 1)
+        last_day = min(today, self.last_day)
+        if first_day > last_day:
+            return 0
+        return self.slice_total(first_day, last_day)
+
+
+def get_backup_file_name(emoji: discord.Emoji):
+    extension = os.path.splitext(urllib.parse.urlparse(emoji.url).path)[1]
+    return emoji.name + extension
+
+
+def get_retry_after(error: discord.HTTPException):
+    """Seconds to wait according to the rate limit headers of a failed request."""
+    headers = getattr(error.response, "headers", None) or {}
+    for header in ("Retry-After", "X-RateLimit-Reset-After"):
+        try:
+            return float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 1.0
+
+
+async def download_emoji(emoji: discord.Emoji, file_name, semaphore: asyncio.Semaphore):
+    """Download an emoji to the backup folder. Returns True if an existing file was replaced."""
+    async with semaphore:
+        for attempt in range(EMOJI_DOWNLOAD_ATTEMPTS):
+            try:
+                emoji_bytes = await emoji.read()
+                break
+            except discord.HTTPException as error:
+                if attempt == EMOJI_DOWNLOAD_ATTEMPTS - 1 or (error.status != 429 and error.status < 500):
+                    raise
+                wait_time = get_retry_after(error) if error.status == 429 else 2**attempt
+                print(f"EMOJI BACKUP: Download of {emoji.name} failed with {error.status}, retrying in {wait_time}s.")
+                await asyncio.sleep(wait_time)
+
+    def write_emoji_file():
+        file_path = os.path.join(EMOJI_BACKUP_FOLDER, file_name)
+        replaced = os.path.exists(file_path)
+        with open(file_path, "wb") as emoji_file:
+            emoji_file.write(emoji_bytes)
+        return replaced
+
+    loop = asyncio.get_running_loop()
+    replaced = await loop.run_in_executor(None, write_emoji_file)
+    print(f"EMOJI BACKUP: Downloaded emoji to: {EMOJI_BACKUP_FOLDER}/{file_name}")
+    return replaced
+
+
+def is_animated_image(file_path):
+    """GIFs and WebP files with the animation flag set become animated emoji. Blocking."""
+    if file_path.endswith(".gif"):
+        return True
+    if file_path.endswith(".webp"):
+        with open(file_path, "rb") as image_file:
+            header = image_file.read(21)
+        return header[12:16] == b"VP8X" and bool(header[20] & 0x02)
+    return False
+
+
+def index_backup_folder():
+    """Map emoji names to their backup file path and whether they are animated. Blocking."""
+    backup_index = dict()
+    if not os.path.isdir(EMOJI_BACKUP_FOLDER):
+        return backup_index
+    for file_name in sorted(os.listdir(EMOJI_BACKUP_FOLDER)):
+        emoji_name, extension = os.path.splitext(file_name)
+        if extension not in EMOJI_FILE_EXTENSIONS:
+            continue
+        file_path = os.path.join(EMOJI_BACKUP_FOLDER, file_name)
+        backup_index[emoji_name] = (file_path, is_animated_image(file_path))
+    return backup_index
+
+
+def read_file_bytes(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+async def upload_emoji(guild: discord.Guild, emoji_name, emoji_bytes):
+    """discord.py waits out the rate limit buckets itself, this only retries limits it gave up on."""
+    for attempt in range(EMOJI_UPLOAD_ATTEMPTS):
+        try:
+            return await guild.create_custom_emoji(name=emoji_name, image=emoji_bytes, reason="Emoji restoration.")
+        except discord.HTTPException as error:
+            if attempt == EMOJI_UPLOAD_ATTEMPTS - 1 or (error.status != 429 and error.status < 500):
+                raise
+            wait_time = get_retry_after(error) if error.status == 429 else 2**attempt
+            print(f"EMOJI RESTORE: Upload of {emoji_name} failed with {error.status}, retrying in {wait_time}s.")
+            await asyncio.sleep(wait_time)
+
+
+def update_emoji_zip(rebuild=False):
+    """Add backup files missing from the archive. Replaced files require rebuilding the archive. Blocking."""
+    backup_files = sorted(os.listdir(EMOJI_BACKUP_FOLDER))
+    if rebuild or not os.path.exists(EMOJI_BACKUP_ZIP):
+        with zipfile.ZipFile(EMOJI_BACKUP_ZIP + ".tmp", "w") as emoji_zip:
+            for file_name in backup_files:
+                emoji_zip.write(os.path.join(EMOJI_BACKUP_FOLDER, file_name), arcname=file_name)
+        os.replace(EMOJI_BACKUP_ZIP + ".tmp", EMOJI_BACKUP_ZIP)
+        return len(backup_files)
+
+    with zipfile.ZipFile(EMOJI_BACKUP_ZIP, "a") as emoji_zip:
+        archived_files = set(emoji_zip.namelist())
+        new_files = [file_name for file_name in backup_files if file_name not in archived_files]
+        for file_name in new_files:
+            emoji_zip.write(os.path.join(EMOJI_BACKUP_FOLDER, file_name), arcname=file_name)
+    return len(new_files)
+
+
 class EmojiManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.pending_counts = collections.Counter()
+        self.pending_events = 0
+        self.emoji_index = dict()
+        self.usage_history = dict()
+        self.history_changed = False
+        self.history_saved_day = get_today()
+        self.history_saved_at = time.monotonic()
 
     async def cog_load(self):
-        pass
+        self.emoji_index = {emoji.id: emoji for emoji in self.bot.emojis}
+        history_data = await data_management.load_data(EMOJI_HISTORY_FILENAME)
+        self.usage_history = {
+            emoji_id: UsageHistory(last_day, counts) for emoji_id, (last_day, counts) in history_data.items()
+        }
+        await self.remember_emoji_names(self.emoji_index.values())
+        await self.migrate_name_keys()
+        self.flush_emoji_counts.start()
+
+    async def cog_unload(self):
+        self.flush_emoji_counts.cancel()
+        await self.write_pending_counts()
+        await self.save_history()
+
+    async def count_emoji_use(self, emoji_key):
+        self.pending_counts[emoji_key] += 1
+        self.pending_events += 1
+        if self.pending_events >= EMOJI_FLUSH_EVENTS:
+            await self.write_pending_counts()
+
+    async def write_pending_counts(self):
+        pending_counts = self.pending_counts
+        self.pending_counts = collections.Counter()
+        self.pending_events = 0
+        if pending_counts:
+            await data_management.increment_values(EMOJI_STATS_FILENAME, pending_counts)
+            self.add_to_history(pending_counts)
+        if get_today() != self.history_saved_day or time.monotonic() - self.history_saved_at >= HISTORY_SAVE_SECONDS:
+            await self.save_history()
+
+    def add_to_history(self, counts):
+        today = get_today()
+        for emoji_key, amount in counts.items():
+            if emoji_key not in self.usage_history:
+                self.usage_history[emoji_key] = UsageHistory(today)
+            self.usage_history[emoji_key].add(today, amount)
+        self.history_changed = True
+
+    async def save_history(self):
+        """Write the changed histories of all emoji with one save."""
+        self.history_saved_day = get_today()
+        self.history_saved_at = time.monotonic()
+        if not self.history_changed:
+            return
+        self.history_changed = False
+        history_data = {emoji_key: history.to_data() for emoji_key, history in self.usage_history.items()}
+        await data_management.save_data(history_data, EMOJI_HISTORY_FILENAME)
+
+    async def remember_emoji_names(self, emojis):
+        """Keep the last known name of every emoji ID, so restores still find the backup files."""
+        emoji_names = await data_management.load_data(EMOJI_NAMES_FILENAME)
+        changes = [("set", emoji.id, emoji.name) for emoji in emojis if emoji_names.get(emoji.id) != emoji.name]
+        if changes:
+            await data_management.journal_changes(EMOJI_NAMES_FILENAME, changes)
+
+    async def migrate_name_keys(self):
+        """Move usage counts stored under an emoji name to the emoji ID."""
+        emoji_usage_dict = await data_management.load_data(EMOJI_STATS_FILENAME)
+        emoji_ids_by_name = {emoji.name: emoji.id for emoji in self.emoji_index.values()}
+        changes = []
+        for emoji_key, uses in emoji_usage_dict.items():
+            if isinstance(emoji_key, str) and emoji_key in emoji_ids_by_name:
+                changes.append(("increment", emoji_ids_by_name[emoji_key], uses))
+                changes.append(("delete", emoji_key, None))
+        if changes:
+            print(f"EMOJI MANAGER: Moving {len(changes) // 2} name keyed usage counts to emoji IDs.")
+            await data_management.journal_changes(EMOJI_STATS_FILENAME, changes)
+
+    async def get_emoji_usage(self, days=None):
+        """Persisted usage counts plus the uses that have not been written yet.
+        With days only the uses of the last days days are counted."""
+        if days:
+            today = get_today()
+            emoji_usage_dict = collections.Counter(
+                {emoji_key: history.total(today, days) for emoji_key, history in self.usage_history.items()}
+            )
+        else:
+            emoji_usage_dict = collections.Counter(await data_management.load_data(EMOJI_STATS_FILENAME))
+        emoji_usage_dict.update(self.pending_counts)
+        return emoji_usage_dict
+
+    @tasks.loop(seconds=EMOJI_FLUSH_SECONDS)
+    async def flush_emoji_counts(self):
+        await self.write_pending_counts()
 
     @discord.app_commands.command(name="add_emoji", description="Upload an emoji to the server.")
     @discord.app_commands.describe(emoji_name="The name of the emoji.", emoji_file="The emoji image.")
@@ -51,54 +338,67 @@ class EmojiManager(commands.Cog):
         )
         await interaction.edit_original_response(content=f"Uploaded your emoji: {str(custom_emoji)}")
 
+    def get_guild_emoji(self, guild: discord.Guild, emoji_id):
+        emoji = self.emoji_index.get(emoji_id)
+        if emoji and emoji.guild_id == guild.id:
+            return emoji
+
+    @commands.Cog.listener(name="on_guild_emojis_update")
+    async def update_emoji_index(self, guild: discord.Guild, before, after):
+        for emoji in before:
+            self.emoji_index.pop(emoji.id, None)
+        for emoji in after:
+            self.emoji_index[emoji.id] = emoji
+        await self.remember_emoji_names(after)
+
     @commands.Cog.listener(name="on_reaction_add")
     async def emoji_usage_counter_reaction(self, reaction: discord.Reaction, member: discord.Member):
-        if not reaction.message.guild:
+        if not reaction.message.guild or not reaction.is_custom_emoji():
             return
-        async with increment_lock:
-            if reaction.emoji in reaction.message.guild.emojis:
-                emoji_usage_dict = await data_management.load_data(EMOJI_STATS_FILENAME)
-                emoji_usage_dict[reaction.emoji.name] = emoji_usage_dict.get(reaction.emoji.name, 0) + 1
-                await data_management.save_data(emoji_usage_dict, EMOJI_STATS_FILENAME)
+        if self.get_guild_emoji(reaction.message.guild, reaction.emoji.id):
+            await self.count_emoji_use(reaction.emoji.id)
 
     @commands.Cog.listener(name="on_message")
     async def emoji_usage_counter_message(self, message: discord.Message):
         if not message.guild:
             return
-        emoji_strings = re.findall(r"<:(.+?):\d+>", message.content)
-        unique_emoji_strings = set(emoji_strings)
-        if unique_emoji_strings:
-            for emoji_string in unique_emoji_strings:
-                emoji: discord.Emoji = discord.utils.get(message.guild.emojis, name=emoji_string)
-                if emoji:
-                    async with increment_lock:
-                        emoji_usage_dict = await data_management.load_data(EMOJI_STATS_FILENAME)
-                        emoji_usage_dict[emoji.name] = emoji_usage_dict.get(emoji.name, 0) + 1
-                        await data_management.save_data(emoji_usage_dict, EMOJI_STATS_FILENAME)
+        unique_emoji_ids = {int(emoji_id) for emoji_id in EMOJI_PATTERN.findall(message.content)}
+        for emoji_id in unique_emoji_ids:
+            if self.get_guild_emoji(message.guild, emoji_id):
+                await self.count_emoji_use(emoji_id)
 
     @discord.app_commands.command(name="emoji_usage", description="Send out emoji usage statistics for the server.")
+    @discord.app_commands.describe(days="Only count uses in this time frame. Counts all uses if not set.")
+    @discord.app_commands.choices(
+        days=[
+            discord.app_commands.Choice(name="Last 7 days", value=7),
+            discord.app_commands.Choice(name="Last 30 days", value=30),
+            discord.app_commands.Choice(name="Last 90 days", value=90),
+        ]
+    )
     @discord.app_commands.guild_only()
     @discord.app_commands.default_permissions(send_messages=True)
-    async def emoji_usage(self, interaction: discord.Interaction):
-        emoji_usage_dict = await data_management.load_data(EMOJI_STATS_FILENAME)
+    async def emoji_usage(self, interaction: discord.Interaction, days: typing.Optional[int] = None):
+        emoji_usage_dict = await self.get_emoji_usage(days)
         emoji_report_lines = []
 
         for emoji_data in sorted(emoji_usage_dict.items(), key=lambda x: x[1], reverse=True):
-            emoji_name, uses = emoji_data
-            emoji = discord.utils.get(interaction.guild.emojis, name=emoji_name)
+            emoji_id, uses = emoji_data
+            emoji = self.get_guild_emoji(interaction.guild, emoji_id)
             if emoji:
                 emoji_line = f"{str(emoji)} {uses}回"
                 emoji_report_lines.append(emoji_line)
 
         for emoji in interaction.guild.emojis:
-            if emoji.name not in emoji_usage_dict:
+            if emoji.id not in emoji_usage_dict:
                 emoji_line = f"{str(emoji)} 0回"
                 emoji_report_lines.append(emoji_line)
 
         emoji_fields = await utility_cog.create_fields(emoji_report_lines)
-        emoji_embeds = await utility_cog.create_embeds_from_fields(
-            emoji_fields, f"{interaction.guild.name} Emoji Usage Statistics.", inline=True
-        )
+        embed_title = f"{interaction.guild.name} Emoji Usage Statistics."
+        if days:
+            embed_title = f"{interaction.guild.name} Emoji Usage Statistics (last {days} days)."
+        emoji_embeds = await utility_cog.create_embeds_from_fields(emoji_fields, embed_title, inline=True)
         await interaction.response.send_message(embed=emoji_embeds[0], ephemeral=True)
 
     @discord.app_commands.command(
@@ -108,42 +408,125 @@ class EmojiManager(commands.Cog):
     @discord.app_commands.default_permissions(administrator=True)
     async def backup_emoji(self, interaction: discord.Interaction):
         await interaction.response.defer()
+        os.makedirs(EMOJI_BACKUP_FOLDER, exist_ok=True)
 
-        for emoji in interaction.guild.emojis:
-            emoji_save_path = f"data/emoji_backup/{emoji.name + emoji.url[-4:]}"
-            if os.path.exists(emoji_save_path):
+        # Only emoji that are new or changed since the last backup are downloaded.
+        backup_files = await data_management.load_data(EMOJI_BACKUP_FILES_FILENAME)
+        emoji_to_download = [
+            emoji
+            for emoji in interaction.guild.emojis
+            if backup_files.get(emoji.id) != get_backup_file_name(emoji)
+            or not os.path.exists(os.path.join(EMOJI_BACKUP_FOLDER, get_backup_file_name(emoji)))
+        ]
+        semaphore = asyncio.Semaphore(EMOJI_DOWNLOAD_CONCURRENCY)
+        results = await asyncio.gather(
+            *[download_emoji(emoji, get_backup_file_name(emoji), semaphore) for emoji in emoji_to_download],
+            return_exceptions=True,
+        )
+
+        changes = []
+        replaced_files = False
+        failed_emoji = []
+        for emoji, result in zip(emoji_to_download, results):
+            if isinstance(result, Exception):
+                print(f"EMOJI BACKUP: Failed to download {emoji.name}: {result}")
+                failed_emoji.append(emoji.name)
                 continue
-            else:
-                await asyncio.sleep(2)
-                await emoji.save(f"data/emoji_backup/{emoji.name + emoji.url[-4:]}")
-                print(f"EMOJI BACKUP: Downloaded emoji to: data/emoji_backup/{emoji.name + emoji.url[-4:]}")
-        await interaction.edit_original_response(content=f"{interaction.user.mention} Finished downloading emoji.")
+            replaced_files = replaced_files or result
+            changes.append(("set", emoji.id, get_backup_file_name(emoji)))
+        if changes:
+            await data_management.journal_changes(EMOJI_BACKUP_FILES_FILENAME, changes)
 
-        def create_emoji_zip():
-            path_to_folder = f"data/emoji_backup"
-            file_to_save = f"data/emoji_backup"
-            shutil.make_archive(file_to_save, "zip", path_to_folder)
+        emoji_usage_dict = await self.get_emoji_usage()
+        usage_stats = {
+            emoji.id: {
+                "name": emoji.name,
+                "file": get_backup_file_name(emoji),
+                "uses": emoji_usage_dict.get(emoji.id, 0),
+            }
+            for emoji in interaction.guild.emojis
+        }
 
         loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, create_emoji_zip)
-        print("EMOJI BACKUP: Created emoji .zip backup file.")
+        archived_count = await loop.run_in_executor(None, update_emoji_zip, replaced_files)
+        # The manifest is only downloaded, so it gets no pickle sidecar. It stays next to the archive instead of in
+        # it, as zipfile can't replace an entry and the counts change with every backup.
+        await loop.run_in_executor(None, data_management.dump_yaml_file, usage_stats, EMOJI_BACKUP_STATS, False)
+        print(f"EMOJI BACKUP: Added {archived_count} files to the emoji .zip backup file.")
+
+        result_message = (
+            f"{interaction.user.mention} Finished downloading emoji. "
+            f"Downloaded {len(changes)} new or changed emoji."
+        )
+        if failed_emoji:
+            result_message += f" Failed to download: {', '.join(failed_emoji)}"
+        await interaction.edit_original_response(content=result_message)
+
+    async def plan_emoji_restore(self, guild: discord.Guild, backup_index):
+        """Pick the most used backed up emoji that fit into the free static and animated slots."""
+        emoji_usage_dict = await self.get_emoji_usage()
+        emoji_names = await data_management.load_data(EMOJI_NAMES_FILENAME)
+        # Backed up emoji without usage data are restored last.
+        used_names = {emoji_names.get(emoji_key, emoji_key) for emoji_key in emoji_usage_dict}
+        for emoji_name in backup_index:
+            if emoji_name not in used_names:
+                emoji_usage_dict[emoji_name] = 0
+
+        existing_names = {emoji.name for emoji in guild.emojis}
+        free_slots = {
+            False: guild.emoji_limit - len([emoji for emoji in guild.emojis if not emoji.animated]),
+            True: guild.emoji_limit - len([emoji for emoji in guild.emojis if emoji.animated]),
+        }
+        restore_plan = []
+        for emoji_key, uses in sorted(emoji_usage_dict.items(), key=lambda item: item[1], reverse=True):
+            emoji_name = emoji_names.get(emoji_key, emoji_key)
+            if emoji_name in existing_names or emoji_name not in backup_index:
+                continue
+            file_path, animated = backup_index[emoji_name]
+            if free_slots[animated] <= 0:
+                continue
+            free_slots[animated] -= 1
+            existing_names.add(emoji_name)
+            restore_plan.append((emoji_name, file_path))
+        return restore_plan
 
     @discord.app_commands.command(name="_restore_emoji", description="Restore emoji.")
     @discord.app_commands.guild_only()
     @discord.app_commands.default_permissions(administrator=True)
     async def restore_emoji(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        emoji_usage_dict = await data_management.load_data(EMOJI_STATS_FILENAME)
-        for emoji_name, uses in sorted(emoji_usage_dict.items(), key=lambda item: item[1], reverse=True):
-            with open(f"data/emoji_backup/{emoji_name}.png", "rb") as emoji_file:
-                emoji_bytes = emoji_file.read()
-            await asyncio.sleep(2)
-            await interaction.guild.create_custom_emoji(name=emoji_name, image=emoji_bytes)
-            await interaction.channel.send(f"Added emoji {emoji_name}")
-
-            if len(interaction.guild.emojis) >= interaction.guild.emoji_limit:
-                break
+        loop = asyncio.get_running_loop()
+        backup_index = await loop.run_in_executor(None, index_backup_folder)
+        if not backup_index:
+            await interaction.edit_original_response(content="There is no emoji backup available.")
+            return
+
+        restore_plan = await self.plan_emoji_restore(interaction.guild, backup_index)
+        status_message = await interaction.channel.send(f"Restoring 0/{len(restore_plan)} emoji...")
+        last_status_update = loop.time()
+        restored_names = []
+        failed_names = []
 
+        for emoji_name, file_path in restore_plan:
+            emoji_bytes = await loop.run_in_executor(None, read_file_bytes, file_path)
+            try:
+                await upload_emoji(interaction.guild, emoji_name, emoji_bytes)
+                restored_names.append(emoji_name)
+            except discord.HTTPException as error:
+                print(f"EMOJI RESTORE: Failed to add {emoji_name}: {error}")
+                failed_names.append(emoji_name)
+
+            if loop.time() - last_status_update >= RESTORE_STATUS_INTERVAL:
+                last_status_update = loop.time()
+                await status_message.edit(
+                    content=f"Restoring {len(restored_names) + len(failed_names)}/{len(restore_plan)} emoji... "
+                    f"Last added: {emoji_name}"
+                )
+
+        status = f"Restored {len(restored_names)}/{len(restore_plan)} emoji."
+        if failed_names:
+            status += f" Failed: {', '.join(failed_names)}"
+        await status_message.edit(content=status)
         await interaction.edit_original_response(content="Finished adding emoji.")
 
     @discord.app_commands.command(
@@ -153,9 +536,17 @@ class EmojiManager(commands.Cog):
     @discord.app_commands.default_permissions(send_messages=True)
     async def download_emoji(self, interaction: discord.Interaction):
         await interaction.response.defer()
+        if not os.path.exists(EMOJI_BACKUP_ZIP):
+            await interaction.edit_original_response(content="There is no emoji backup yet.")
+            return
+
+        # The archive is kept up to date by the backup, so it is streamed from disk as is.
+        attachments = [discord.File(EMOJI_BACKUP_ZIP)]
+        if os.path.exists(EMOJI_BACKUP_STATS):
+            attachments.append(discord.File(EMOJI_BACKUP_STATS))
         await interaction.edit_original_response(
             content="Here are your requested emoji backup files:",
-            attachments=[discord.File(f"data/emoji_backup.zip")],
+            attachments=attachments,
         )
 
 
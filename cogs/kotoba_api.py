@@ -0,0 +1,268 @@
+"""Fetching and caching Kotoba game reports"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+from aiohttp import web
+
+from . import data_management
+
+KOTOBA_API_URL = "https://kotobaweb.com"
+GAME_REPORT_PATH = "/api/game_reports/{quiz_id}"
+GAME_REPORT_FOLDER = "data/kotoba_reports"
+PROCESSED_QUIZZES_FILENAME = "kotoba_processed_quizzes.yml"
+REPORT_CACHE_SIZE = 256
+# Processed quiz IDs and archived reports older than this are removed.
+PROCESSED_QUIZ_RETENTION_DAYS = 90
+
+# Client settings
+REQUEST_TIMEOUT = 10
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+MAX_CONCURRENT_REQUESTS = 4
+# The circuit opens after this many failed fetches in a row and stays open for CIRCUIT_RESET_SECONDS.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 60
+LATENCY_SAMPLES = 500
+
+
+def get_report_path(quiz_id):
+    return os.path.join(GAME_REPORT_FOLDER, f"{quiz_id}.json")
+
+
+def read_report(quiz_id):
+    """Return the archived report or None. Blocking."""
+    try:
+        with open(get_report_path(quiz_id)) as report_file:
+            return json.load(report_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_report(quiz_id, report):
+    """Archive a report, replacing the file atomically. Blocking."""
+    os.makedirs(GAME_REPORT_FOLDER, exist_ok=True)
+    report_path = get_report_path(quiz_id)
+    with open(report_path + ".tmp", "w") as report_file:
+        json.dump(report, report_file)
+    os.replace(report_path + ".tmp", report_path)
+
+
+class KotobaApiError(Exception):
+    pass
+
+
+class KotobaUnavailableError(KotobaApiError):
+    """Raised without a request while the circuit breaker is open."""
+
+
+class KotobaClient:
+    """Game report requests with timeouts, retries with exponential backoff, a concurrency limit and a circuit breaker.
+
+    Uses the passed aiohttp session. base_url can point to the stand-in server of this module for offline tests."""
+
+    def __init__(self, session: aiohttp.ClientSession, base_url=KOTOBA_API_URL, initial_delay=1):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.initial_delay = initial_delay
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.counters = collections.Counter()
+
+    def is_circuit_open(self):
+        return time.monotonic() < self.circuit_open_until
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.counters["failed_fetches"] += 1
+        if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self.circuit_open_until = time.monotonic() + CIRCUIT_RESET_SECONDS
+            self.counters["circuit_opened"] += 1
+            print(
+                f"KOTOBA API: Opening circuit for {CIRCUIT_RESET_SECONDS}s after {self.consecutive_failures} failures."
+            )
+
+    async def request_once(self, url):
+        """Returns the parsed report. Raises KotobaApiError if the request should not be retried."""
+        start = time.perf_counter()
+        self.counters["requests"] += 1
+        try:
+            async with self.semaphore:
+                async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as resp:
+                    if resp.status == 404:
+                        raise KotobaApiError(f"Game report not found: {url}")
+                    resp.raise_for_status()
+                    return await resp.json(content_type=None)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def fetch_game_report(self, quiz_id):
+        if self.is_circuit_open():
+            self.counters["rejected"] += 1
+            raise KotobaUnavailableError("Kotoba API circuit is open.")
+
+        # Reports are not always available right after the quiz ended.
+        await asyncio.sleep(self.initial_delay)
+        url = self.base_url + GAME_REPORT_PATH.format(quiz_id=quiz_id)
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                report = await self.request_once(url)
+                self.consecutive_failures = 0
+                return report
+            except KotobaApiError:
+                self.counters["errors"] += 1
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as error:
+                self.counters["errors"] += 1
+                if attempt == MAX_ATTEMPTS - 1:
+                    self.record_failure()
+                    raise KotobaApiError(f"Failed to fetch {url} after {MAX_ATTEMPTS} attempts: {error!r}")
+                self.counters["retries"] += 1
+                backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+
+    def get_metrics(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(share):
+            return latencies[min(len(latencies) - 1, int(share * len(latencies)))] if latencies else None
+
+        return {
+            **self.counters,
+            "circuit_open": self.is_circuit_open(),
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class GameReportCache:
+    """Game reports by quiz ID, kept in a bounded LRU in memory and archived on disk.
+
+    fetch_report is the coroutine function used when a report is in neither. Concurrent requests for the same
+    quiz share one fetch."""
+
+    def __init__(self, fetch_report, max_size=REPORT_CACHE_SIZE):
+        self.fetch_report = fetch_report
+        self.max_size = max_size
+        self.reports = collections.OrderedDict()
+        self.pending_reports = dict()
+
+    def remember(self, quiz_id, report):
+        self.reports[quiz_id] = report
+        self.reports.move_to_end(quiz_id)
+        while len(self.reports) > self.max_size:
+            self.reports.popitem(last=False)
+
+    async def load(self, quiz_id):
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(None, read_report, quiz_id)
+        if report is None:
+            report = await self.fetch_report(quiz_id)
+            await loop.run_in_executor(None, write_report, quiz_id, report)
+        self.remember(quiz_id, report)
+        return report
+
+    async def get(self, quiz_id):
+        if quiz_id in self.reports:
+            self.reports.move_to_end(quiz_id)
+            return self.reports[quiz_id]
+
+        if quiz_id not in self.pending_reports:
+            self.pending_reports[quiz_id] = asyncio.ensure_future(self.load(quiz_id))
+            self.pending_reports[quiz_id].add_done_callback(lambda _: self.pending_reports.pop(quiz_id, None))
+        return await asyncio.shield(self.pending_reports[quiz_id])
+
+
+async def is_processed(quiz_id):
+    return await data_management.load_value(PROCESSED_QUIZZES_FILENAME, quiz_id) is not None
+
+
+async def mark_processed(quiz_id):
+    await data_management.set_value(PROCESSED_QUIZZES_FILENAME, quiz_id, datetime.utcnow())
+
+
+def remove_old_reports(quiz_ids, cutoff):
+    """Delete the archived reports of quiz_ids and any report last written before cutoff. Blocking."""
+    removed_count = 0
+    try:
+        file_names = os.listdir(GAME_REPORT_FOLDER)
+    except FileNotFoundError:
+        return removed_count
+    cutoff_timestamp = cutoff.timestamp()
+    for file_name in file_names:
+        quiz_id, extension = os.path.splitext(file_name)
+        if extension != ".json":
+            continue
+        report_path = os.path.join(GAME_REPORT_FOLDER, file_name)
+        try:
+            if quiz_id in quiz_ids or os.path.getmtime(report_path) < cutoff_timestamp:
+                os.remove(report_path)
+                removed_count += 1
+        except FileNotFoundError:
+            continue
+    return removed_count
+
+
+async def prune_processed_quizzes(retention_days=PROCESSED_QUIZ_RETENTION_DAYS):
+    """Forget processed quizzes older than the retention window and delete their archived reports.
+
+    Returns the number of removed quiz IDs and report files."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    processed_quizzes = await data_management.load_data(PROCESSED_QUIZZES_FILENAME)
+    old_quiz_ids = {quiz_id for quiz_id, processed_at in processed_quizzes.items() if processed_at < cutoff}
+    if old_quiz_ids:
+        for quiz_id in old_quiz_ids:
+            del processed_quizzes[quiz_id]
+        await data_management.save_data(processed_quizzes, PROCESSED_QUIZZES_FILENAME)
+
+    loop = asyncio.get_running_loop()
+    # Report files are stamped with the local time of the file system.
+    local_cutoff = datetime.now() - timedelta(days=retention_days)
+    removed_report_count = await loop.run_in_executor(None, remove_old_reports, old_quiz_ids, local_cutoff)
+    return len(old_quiz_ids), removed_report_count
+
+
+#########################################
+
+# Stand-in server for offline load tests
+
+
+def create_stand_in_app(report_folder, latency=0.0, error_rate=0.0):
+    """Serve archived reports the way kotobaweb.com does, with optional latency and injected failures."""
+
+    async def game_report(request: web.Request):
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        if random.random() < error_rate:
+            return web.Response(status=503, text="Injected failure.")
+        report_path = os.path.join(report_folder, f"{request.match_info['quiz_id']}.json")
+        if not os.path.exists(report_path):
+            return web.Response(status=404)
+        return web.FileResponse(report_path, headers={"Content-Type": "application/json"})
+
+    app = web.Application()
+    app.router.add_get(GAME_REPORT_PATH.format(quiz_id="{quiz_id}"), game_report)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve archived Kotoba game reports locally.")
+    parser.add_argument("--reports", default=GAME_REPORT_FOLDER, help="Folder with <quiz_id>.json reports.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Average response delay in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503.")
+    arguments = parser.parse_args()
+    web.run_app(
+        create_stand_in_app(arguments.reports, arguments.latency, arguments.error_rate),
+        host="127.0.0.1",
+        port=arguments.port,
+    )
@@ -1,15 +1,32 @@
-import asyncio
-import os
+import csv
+import io
 import re
+import sqlite3
+import time
+import typing
 
 import aiohttp
 import discord
 from discord.ext import commands
+from discord.ext import tasks
 
 from . import data_management
+from . import kotoba_api
+from . import quiz_history
+from . import quiz_rules
 
 KOTOBA_BOT_ID = 251239170058616833
 
+# /rankusers mentions members inline up to this length, pages through embeds up to RANKUSERS_PAGED_MEMBERS
+# members and sends a file beyond that.
+RANKUSERS_INLINE_LENGTH = 500
+RANKUSERS_PAGED_MEMBERS = 500
+RANKUSERS_PAGE_SIZE = 50
+RANKUSERS_VIEW_TIMEOUT = 300
+
+QUIZSTATS_RECENT_ATTEMPTS = 5
+QUIZSTATS_ACTIVITY_DAYS = 7
+
 
 async def give_reward_role(member, role_id_to_get, role_id_to_remove=None):
     """Gives and removes a role from the role name."""
@@ -23,103 +40,166 @@ async def give_reward_role(member, role_id_to_get, role_id_to_remove=None):
         await member.remove_roles(role_to_remove)
 
 
-async def verify_quiz_settings(user_rank_data, quiz_data, member: discord.Member):
+async def verify_quiz_settings(validator: quiz_rules.QuizValidator, quiz_data, member: discord.Member):
     """Ensures a user didn't use cheat settings for the quiz."""
-    answer_count = user_rank_data["points"]
-    answer_time_limit = user_rank_data["max_time"]
-    font = user_rank_data["font"]
-    font_size = user_rank_data["font_size"]
-    fail_count = user_rank_data["allowed_fails"]
-    command = user_rank_data["command"]
+    passed, failure_reason = validator.validate(quiz_data)
+    if not passed:
+        return False, failure_reason + f"\nUse the following command to try again: `{validator.command}`"
 
-    try_again_line = f"\nUse the following command to try again: `{command}`"
+    combined_name = " + ".join([deck["name"] for deck in quiz_data["decks"]])
 
-    user_count = len(quiz_data["participants"])
-    if user_count > 1:
-        return False, "Quiz failed due to multiple people participating." + try_again_line
+    return (
+        True,
+        f"{member.mention} has passed the {combined_name}!" f"\nUse `/levelup` to get the next level up command.",
+    )
 
-    shuffle = quiz_data["settings"]["shuffle"]
-    if not shuffle:
-        return False, "Quiz failed due to the shuffle setting being activated." + try_again_line
 
-    is_loaded = quiz_data["isLoaded"]
-    if is_loaded:
-        return False, "Quiz failed due to being loaded." + try_again_line
+class RankIndex:
+    """Lookup tables compiled from the rank_system and rank_hierarchy settings."""
 
-    for deck in quiz_data["decks"]:
-        if deck["mc"]:
-            return False, "Quiz failed due to being set to multiple choice." + try_again_line
+    def __init__(self, rank_data, rank_hierarchy):
+        self.rank_data = rank_data
+        # If a member has several rank roles, the rank listed last in rank_data applies.
+        self.rank_position = {rank["rank_to_have"]: position for position, rank in enumerate(rank_data)}
+        self.rank_by_role_id = {rank["rank_to_have"]: rank for rank in rank_data}
+        self.rank_by_deck_string = {rank["name"]: rank for rank in rank_data}
+        self.validator_by_deck_string = quiz_rules.compile_rank_system(rank_data)
+        # Dicts keep insertion order, so this doubles as an ordered set of the rank role IDs.
+        self.rank_hierarchy = dict.fromkeys(rank_hierarchy)
 
-    for deck in quiz_data["decks"]:
-        try:
-            if deck["startIndex"]:
-                return False, "Quiz failed due to having a start index." + try_again_line
-        except KeyError:
-            pass
-        try:
-            if deck["endIndex"]:
-                return False, "Quiz failed due to having an end index." + try_again_line
-        except KeyError:
-            pass
+    def get_member_rank_data(self, member: discord.Member):
+        """The rank data of the next level up for the member, or None."""
+        rank_role_ids = [role.id for role in member.roles if role.id in self.rank_by_role_id]
+        if not rank_role_ids:
+            return None
+        return self.rank_by_role_id[max(rank_role_ids, key=self.rank_position.get)]
 
-    if answer_count != quiz_data["settings"]["scoreLimit"]:
-        return False, "Set score limit and required score limit don't match." + try_again_line
 
-    if answer_time_limit != quiz_data["settings"]["answerTimeLimitInMs"]:
-        return False, "Set answer time does match required answer time." + try_again_line
+class RankDistribution:
+    """Member count per rank role plus the members with several or no rank roles, updated member by member."""
 
-    if font != "any" and font != quiz_data["settings"]["font"]:
-        return False, "Set font does not match required font." + try_again_line
+    def __init__(self, rank_role_ids):
+        self.rank_role_ids = rank_role_ids
+        self.rank_counts = {role_id: 0 for role_id in rank_role_ids}
+        self.member_ranks = dict()
+        self.duplicate_role_members = set()
+        self.missing_role_members = set()
 
-    if font_size != quiz_data["settings"]["fontSize"]:
-        return False, "Set font size does not match required font size." + try_again_line
+    def add_member(self, member: discord.Member):
+        if member.bot:
+            return
+        self.remove_member(member.id)
+        member_ranks = [role.id for role in member.roles if role.id in self.rank_role_ids]
+        self.member_ranks[member.id] = member_ranks
+        for role_id in member_ranks:
+            self.rank_counts[role_id] += 1
+        if not member_ranks:
+            self.missing_role_members.add(member.id)
+        elif len(member_ranks) > 1:
+            self.duplicate_role_members.add(member.id)
+
+    def remove_member(self, member_id):
+        member_ranks = self.member_ranks.pop(member_id, None)
+        if member_ranks is None:
+            return
+        for role_id in member_ranks:
+            self.rank_counts[role_id] -= 1
+        self.missing_role_members.discard(member_id)
+        self.duplicate_role_members.discard(member_id)
+
+    @property
+    def total_members(self):
+        return len(self.member_ranks)
+
+
+def build_member_list_file(role: discord.Role, as_csv=False):
+    """Write the role members to an in-memory file."""
+    if as_csv:
+        text_buffer = io.StringIO()
+        writer = csv.writer(text_buffer)
+        writer.writerow(["id", "name", "display_name", "joined_at"])
+        for member in role.members:
+            joined_at = member.joined_at.isoformat() if member.joined_at else ""
+            writer.writerow([member.id, str(member), member.display_name, joined_at])
+        content = text_buffer.getvalue()
+        file_name = f"rank_users_{role.id}.csv"
+    else:
+        member_string = [str(member) for member in role.members]
+        member_string.append(f"\nTotal {len(role.members)} members.")
+        content = "\n".join(member_string)
+        file_name = f"rank_users_{role.id}.txt"
+    return discord.File(io.BytesIO(content.encode("utf-8")), filename=file_name)
 
-    failed_question_count = len(quiz_data["questions"]) - quiz_data["scores"][0]["score"]
-    if failed_question_count > fail_count:
-        return False, "Failed too many questions." + try_again_line
 
-    if answer_count != quiz_data["scores"][0]["score"]:
-        return False, "Not enough questions answered." + try_again_line
+class MemberPagesView(discord.ui.View):
+    """Pages through the members of a role. Only the user who ran the command can turn pages."""
 
-    combined_name = " + ".join([deck["name"] for deck in quiz_data["decks"]])
+    def __init__(self, role: discord.Role, user_id):
+        super().__init__(timeout=RANKUSERS_VIEW_TIMEOUT)
+        self.role = role
+        self.user_id = user_id
+        self.mentions = [member.mention for member in role.members]
+        self.page_count = max(1, -(-len(self.mentions) // RANKUSERS_PAGE_SIZE))
+        self.page = 0
+        self.update_buttons()
 
-    return (
-        True,
-        f"{member.mention} has passed the {combined_name}!" f"\nUse `/levelup` to get the next level up command.",
-    )
+    def build_embed(self):
+        page_mentions = self.mentions[self.page * RANKUSERS_PAGE_SIZE : (self.page + 1) * RANKUSERS_PAGE_SIZE]
+        embed = discord.Embed(title=f"Members with {self.role.name}", description="\n".join(page_mentions))
+        embed.set_footer(text=f"Page {self.page + 1}/{self.page_count} · {len(self.mentions)} members")
+        return embed
 
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
 
-async def verify_if_rank_quiz(member: discord.Member, quiz_data, rank_data):
-    """Determines if a quiz is a rank quiz. If so returns the rank data for the reward rank."""
-    user_rank_data = False
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.user_id
+
+    async def show_page(self, interaction: discord.Interaction, page):
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
 
-    # Get corresponding data.
-    for rank in rank_data:
-        role_id_to_lose = rank["rank_to_have"]
-        for role in member.roles:
-            if role.id == role_id_to_lose:
-                user_rank_data = rank
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+
+async def verify_if_rank_quiz(member: discord.Member, quiz_data, rank_index: RankIndex):
+    """Determines if a quiz is a rank quiz. If so returns the rank data for the reward rank."""
+    user_rank_data = rank_index.get_member_rank_data(member)
 
     if not user_rank_data:
         return False
 
     # Determine if current quiz is the correct one
-    deck_strings = []
-    for deck in quiz_data["decks"]:
-        try:
-            deck_strings.append(deck["shortName"])
-        except KeyError:
-            return  # Review quiz without deck name
-    combined_deck_string = "+".join(deck_strings)
-
-    quiz_name = user_rank_data["name"]
+    combined_deck_string = quiz_rules.get_deck_string(quiz_data)
+    if combined_deck_string is None:
+        return  # Review quiz without deck name
 
-    if combined_deck_string == quiz_name:
+    if rank_index.rank_by_deck_string.get(combined_deck_string) is user_rank_data:
         return user_rank_data
     else:
         return False
 
 
+def format_pass_rate(attempts, passes):
+    return f"{passes}/{attempts} passed ({passes / attempts:.0%})" if attempts else "no attempts"
+
+
+def format_attempt(attempt):
+    result = "passed" if attempt["passed"] else f"failed: {attempt['reason']}"
+    return (
+        f"<t:{int(attempt['attempted_at'])}:R> <@{attempt['member_id']}> {attempt['rank']} "
+        f"({attempt['score']} points, {attempt['fails']} fails) {result}"
+    )
+
+
 async def get_quiz_id(message: discord.Message):
     """Extract the ID of a quiz to use with the API."""
     try:
@@ -138,11 +218,19 @@ class LevelUp(commands.Cog):
     def __init__(self, bot):
         self.aiosession = None
         self.bot = bot
+        self.game_reports = kotoba_api.GameReportCache(self.extract_quiz_data_from_id)
+        self.processing_quizzes = set()
 
     async def cog_load(self):
         self.aiosession = aiohttp.ClientSession()
         self.guild = self.bot.get_guild(self.bot.config["guild_id"])
         rank_system_settings = self.bot.config["rank_system"]
+        self.kotoba_client = kotoba_api.KotobaClient(
+            self.aiosession, rank_system_settings.get("kotoba_api_url", kotoba_api.KOTOBA_API_URL)
+        )
+        self.quiz_history = quiz_history.QuizHistory(
+            rank_system_settings.get("quiz_history_database", quiz_history.DEFAULT_DATABASE)
+        )
 
         success_announce_channel_id = rank_system_settings["success_announce_channel"]
         self.success_announce_channel = discord.utils.get(self.guild.channels, id=success_announce_channel_id)
@@ -152,21 +240,45 @@ class LevelUp(commands.Cog):
             discord.utils.get(self.guild.channels, id=channel_id) for channel_id in failure_channel_ids
         ]
 
-        self.rank_data = rank_system_settings["rank_data"]
+        self.build_rank_index()
+        self.prune_processed_quizzes.start()
+
+    def build_rank_index(self):
+        self.rank_data = self.bot.config["rank_system"]["rank_data"]
+        self.rank_index = RankIndex(self.rank_data, self.bot.config["rank_hierarchy"])
+        self.rank_distribution = RankDistribution(self.rank_index.rank_hierarchy)
+        for member in self.guild.members:
+            self.rank_distribution.add_member(member)
+
+    @commands.Cog.listener(name="on_config_reload")
+    async def rebuild_rank_index(self):
+        self.build_rank_index()
+        print("LEVELUP: Rebuilt rank index.")
+
+    @commands.Cog.listener(name="on_member_update")
+    async def update_rank_distribution(self, before: discord.Member, after: discord.Member):
+        if after.guild == self.guild and before.roles != after.roles:
+            self.rank_distribution.add_member(after)
+
+    @commands.Cog.listener(name="on_member_join")
+    async def add_to_rank_distribution(self, member: discord.Member):
+        if member.guild == self.guild:
+            self.rank_distribution.add_member(member)
+
+    @commands.Cog.listener(name="on_member_remove")
+    async def remove_from_rank_distribution(self, member: discord.Member):
+        if member.guild == self.guild:
+            self.rank_distribution.remove_member(member.id)
 
     async def cog_unload(self):
+        self.prune_processed_quizzes.cancel()
         await self.aiosession.close()
+        await self.quiz_history.close()
 
     @discord.app_commands.command(name="levelup", description="Get the next levelup command.")
     @discord.app_commands.guild_only()
     async def levelup(self, interaction: discord.Interaction):
-        user_rank_data = None
-
-        for rank_data in self.rank_data:
-            role_id_to_have = rank_data["rank_to_have"]
-            for role in interaction.user.roles:
-                if role.id == role_id_to_have:
-                    user_rank_data = rank_data
+        user_rank_data = self.rank_index.get_member_rank_data(interaction.user)
 
         if user_rank_data:
             command = user_rank_data["command"]
@@ -183,62 +295,53 @@ class LevelUp(commands.Cog):
         await interaction.response.send_message("\n".join(command_list), ephemeral=True)
 
     @discord.app_commands.command(name="rankusers", description="See all users with a specific role.")
-    @discord.app_commands.describe(role="Role for which all members should be displayed.")
+    @discord.app_commands.describe(
+        role="Role for which all members should be displayed.",
+        csv_file="Send a CSV file with IDs and join dates instead.",
+    )
     @discord.app_commands.guild_only()
-    async def rankusers(self, interaction: discord.Interaction, role: discord.Role):
+    async def rankusers(self, interaction: discord.Interaction, role: discord.Role, csv_file: typing.Optional[bool]):
         member_count = len(role.members)
-        mention_string = []
-        for member in role.members:
-            mention_string.append(member.mention)
-        if len(" ".join(mention_string)) < 500:
+        if csv_file:
+            await interaction.response.send_message("Here you go:", file=build_member_list_file(role, as_csv=True))
+            return
+
+        mention_string = [member.mention for member in role.members]
+        if len(" ".join(mention_string)) < RANKUSERS_INLINE_LENGTH:
             mention_string.append(f"\nA total {member_count} members have the role {role.mention}.")
             await interaction.response.send_message(
                 " ".join(mention_string), allowed_mentions=discord.AllowedMentions.none()
             )
+        elif member_count <= RANKUSERS_PAGED_MEMBERS:
+            member_pages_view = MemberPagesView(role, interaction.user.id)
+            await interaction.response.send_message(embed=member_pages_view.build_embed(), view=member_pages_view)
         else:
-            member_string = [str(member) for member in role.members]
-            member_string.append(f"\nTotal {member_count} members.")
-            with open("data/rank_user_count.txt", "w") as text_file:
-                text_file.write("\n".join(member_string))
-            await interaction.response.send_message("Here you go:", file=discord.File("data/rank_user_count.txt"))
-            os.remove("data/rank_user_count.txt")
+            await interaction.response.send_message("Here you go:", file=build_member_list_file(role))
 
     @discord.app_commands.command(name="ranktable", description="Get an overview of the amount of users in each rank.")
     @discord.app_commands.guild_only()
     async def ranktable(self, interaction: discord.Interaction):
-        rank_role_ids = self.bot.config["rank_hierarchy"]
-        rank_roles = [discord.utils.get(interaction.guild.roles, id=role_id) for role_id in rank_role_ids]
-        duplicate_role_members = []
-        missing_role_members = []
-        total_members = 0
-        rank_count = dict()
-        for member in interaction.guild.members:
-            role_count = 0
-            if member.bot:
-                continue
-            total_members += 1
-            for role in member.roles:
-                if role in rank_roles:
-                    role_count += 1
-                    rank_count[role.name] = rank_count.get(role.name, 0) + 1
-            if role_count == 0:
-                missing_role_members.append(member)
-            elif role_count > 1:
-                duplicate_role_members.append(member)
+        rank_distribution = self.rank_distribution
 
         ranktable_message = ["**Role Distribution**"]
-        for role_name in [role.name for role in rank_roles]:
-            ranktable_message.append(f"{role_name}: {rank_count[role_name]}")
-
-        if duplicate_role_members:
-            duplicate_mention_string = " ".join([member.mention for member in duplicate_role_members])
+        for role_id, member_count in rank_distribution.rank_counts.items():
+            role = interaction.guild.get_role(role_id)
+            if role:
+                ranktable_message.append(f"{role.name}: {member_count}")
+
+        if rank_distribution.duplicate_role_members:
+            duplicate_mention_string = " ".join(
+                [f"<@{member_id}>" for member_id in rank_distribution.duplicate_role_members]
+            )
             ranktable_message.append(f"\nMembers with duplicate roles:\n {duplicate_mention_string}")
 
-        if missing_role_members:
-            missing_mention_string = " ".join([member.mention for member in missing_role_members])
+        if rank_distribution.missing_role_members:
+            missing_mention_string = " ".join(
+                [f"<@{member_id}>" for member_id in rank_distribution.missing_role_members]
+            )
             ranktable_message.append(f"\nMembers with missing roles:\n {missing_mention_string}")
 
-        ranktable_message.append(f"\nTotal member count: {total_members}")
+        ranktable_message.append(f"\nTotal member count: {rank_distribution.total_members}")
         ranktable_string = "\n".join(ranktable_message)
 
         await interaction.response.send_message(ranktable_string, allowed_mentions=discord.AllowedMentions.none())
@@ -252,13 +355,28 @@ class LevelUp(commands.Cog):
         if not quiz_id:
             return
 
-        quiz_data = await self.extract_quiz_data_from_id(quiz_id)
+        # Every report is only verified once, even if it shows up again. The quiz is claimed before the first await,
+        # so a second report arriving while the first is checked can't pass as well.
+        if quiz_id in self.processing_quizzes:
+            return
+        self.processing_quizzes.add(quiz_id)
+        try:
+            if await kotoba_api.is_processed(quiz_id):
+                return
+            quiz_data = await self.game_reports.get(quiz_id)
+            await kotoba_api.mark_processed(quiz_id)
+        except kotoba_api.KotobaApiError as error:
+            print(f"LEVELUP: Unable to get the report for quiz {quiz_id}: {error}")
+            return
+        finally:
+            self.processing_quizzes.discard(quiz_id)
 
         member = message.guild.get_member(int(quiz_data["participants"][0]["discordUser"]["id"]))
-        user_rank_data = await verify_if_rank_quiz(member, quiz_data, self.rank_data)
+        user_rank_data = await verify_if_rank_quiz(member, quiz_data, self.rank_index)
 
         if user_rank_data:
-            passed, info = await verify_quiz_settings(user_rank_data, quiz_data, member)
+            validator = self.rank_index.validator_by_deck_string[user_rank_data["name"]]
+            passed, info = await verify_quiz_settings(validator, quiz_data, member)
         else:
             passed = False
             info = "Wrong quiz for your current level."
@@ -272,11 +390,102 @@ class LevelUp(commands.Cog):
             if message.channel in self.failure_channels:
                 await message.channel.send(f"{member.mention} {info}")
 
+        # Only recorded once the outcome is handled, so the history can never hold up a promotion.
+        if user_rank_data:
+            await self.record_quiz_attempt(quiz_id, member, user_rank_data, quiz_data, passed, info, message)
+
+    @tasks.loop(hours=24)
+    async def prune_processed_quizzes(self):
+        retention_days = self.bot.config["rank_system"].get(
+            "processed_quiz_retention_days", kotoba_api.PROCESSED_QUIZ_RETENTION_DAYS
+        )
+        pruned_quiz_count, removed_report_count = await kotoba_api.prune_processed_quizzes(retention_days)
+        if pruned_quiz_count or removed_report_count:
+            print(
+                f"LEVELUP: Pruned {pruned_quiz_count} processed quizzes and {removed_report_count} archived reports "
+                f"older than {retention_days} days."
+            )
+
+    async def record_quiz_attempt(self, quiz_id, member, user_rank_data, quiz_data, passed, info, message):
+        try:
+            await self.quiz_history.record_attempt(
+                quiz_id,
+                member.id,
+                user_rank_data["name"],
+                quiz_data,
+                passed,
+                None if passed else info.partition("\n")[0],
+                message.created_at.timestamp(),
+            )
+        except sqlite3.Error as error:
+            print(f"LEVELUP: Failed to record the attempt for quiz {quiz_id}: {error}")
+
+    @discord.app_commands.command(name="quizstats", description="See pass rates and recent rank quiz attempts.")
+    @discord.app_commands.describe(
+        member="Only show the attempts of this member.", rank="Only show the attempts for this rank quiz."
+    )
+    @discord.app_commands.guild_only()
+    async def quizstats(
+        self,
+        interaction: discord.Interaction,
+        member: typing.Optional[discord.Member],
+        rank: typing.Optional[str],
+    ):
+        if member:
+            stats_message = [f"**Rank quiz stats for {member.mention}**"]
+            member_stats = await self.quiz_history.get_member_stats(member.id)
+            for rank_name, stats in member_stats.items():
+                stats_message.append(f"{rank_name}: {format_pass_rate(stats['attempts'], stats['passes'])}")
+            recent_attempts = await self.quiz_history.get_recent_attempts(
+                member_id=member.id, limit=QUIZSTATS_RECENT_ATTEMPTS
+            )
+        else:
+            stats_message = [f"**Rank quiz stats{f' for {rank}' if rank else ''}**"]
+            rank_stats = await self.quiz_history.get_rank_stats(rank)
+            for rank_name, stats in rank_stats.items():
+                rank_line = f"{rank_name}: {format_pass_rate(stats['attempts'], stats['passes'])}"
+                if stats["fails_before_pass_p50"] is not None:
+                    rank_line += (
+                        f", fails before passing: median {stats['fails_before_pass_p50']}, "
+                        f"90th percentile {stats['fails_before_pass_p90']}"
+                    )
+                stats_message.append(rank_line)
+            activity_start = time.time() - QUIZSTATS_ACTIVITY_DAYS * 24 * 60 * 60
+            recent_count = await self.quiz_history.count_attempts_since(activity_start)
+            stats_message.append(f"\nAttempts in the last {QUIZSTATS_ACTIVITY_DAYS} days: {recent_count}")
+            recent_attempts = await self.quiz_history.get_recent_attempts(rank=rank, limit=QUIZSTATS_RECENT_ATTEMPTS)
+
+        if len(stats_message) == 1 and not recent_attempts:
+            stats_message.append("No attempts recorded yet.")
+        if recent_attempts:
+            stats_message.append("\n**Recent attempts**")
+            stats_message.extend(format_attempt(attempt) for attempt in recent_attempts)
+
+        await interaction.response.send_message(
+            "\n".join(stats_message), allowed_mentions=discord.AllowedMentions.none()
+        )
+
+    @quizstats.autocomplete("rank")
+    async def quizstats_rank_autocomplete(self, interaction: discord.Interaction, current_input: str):
+        return [
+            discord.app_commands.Choice(name=rank_data["name"], value=rank_data["name"])
+            for rank_data in self.rank_data
+            if current_input.lower() in rank_data["name"].lower()
+        ][0:25]
+
     async def extract_quiz_data_from_id(self, quiz_id):
-        jsonurl = f"https://kotobaweb.com/api/game_reports/{quiz_id}"
-        await asyncio.sleep(1)
-        async with self.aiosession.get(jsonurl) as resp:
-            return await resp.json()
+        return await self.kotoba_client.fetch_game_report(quiz_id)
+
+    @discord.app_commands.command(name="_kotoba_stats", description="Show Kotoba API latency and error metrics.")
+    @discord.app_commands.guild_only()
+    @discord.app_commands.default_permissions(administrator=True)
+    async def kotoba_stats(self, interaction: discord.Interaction):
+        metrics = self.kotoba_client.get_metrics()
+        metric_lines = [
+            f"{name}: {value:.3f}s" if name.startswith("latency") and value is not None else f"{name}: {value}"
+            for name, value in metrics.items()
+        ]
+        await interaction.response.send_message("\n".join(metric_lines), ephemeral=True)
 
 
 async def setup(bot):
@@ -0,0 +1,167 @@
+"""History of rank quiz attempts with precomputed pass statistics"""
+import time
+
+from . import sqlite_storage
+
+DEFAULT_DATABASE = "data/quiz_history.sqlite3"
+
+# The aggregate tables are updated in the same transaction as each attempt is stored, so statistics never
+# need to scan the attempts table.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    quiz_id TEXT PRIMARY KEY,
+    member_id INTEGER NOT NULL,
+    rank TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    fails INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    reason TEXT,
+    attempted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_by_member ON attempts (member_id, attempted_at);
+CREATE INDEX IF NOT EXISTS attempts_by_rank ON attempts (rank, attempted_at);
+CREATE INDEX IF NOT EXISTS attempts_by_time ON attempts (attempted_at);
+CREATE TABLE IF NOT EXISTS rank_totals (
+    rank TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    passes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS member_totals (
+    member_id INTEGER NOT NULL,
+    rank TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    passes INTEGER NOT NULL,
+    PRIMARY KEY (member_id, rank)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fails_before_pass (
+    rank TEXT NOT NULL,
+    failed_attempts INTEGER NOT NULL,
+    members INTEGER NOT NULL,
+    PRIMARY KEY (rank, failed_attempts)
+) WITHOUT ROWID;
+"""
+
+
+def get_attempt_values(quiz_data):
+    """Score and failed question count of a game report."""
+    score = quiz_data["scores"][0]["score"] if quiz_data.get("scores") else 0
+    return score, max(0, len(quiz_data.get("questions", [])) - score)
+
+
+def get_percentile(histogram, share):
+    """Percentile from (value, count) pairs sorted by value."""
+    total = sum(count for _, count in histogram)
+    if not total:
+        return None
+    threshold = share * total
+    running_count = 0
+    for value, count in histogram:
+        running_count += count
+        if running_count >= threshold:
+            return value
+    return histogram[-1][0]
+
+
+class QuizHistory(sqlite_storage.SqliteDatabase):
+    """Stores every verified rank quiz attempt."""
+
+    schema = SCHEMA
+
+    def __init__(self, database_path=DEFAULT_DATABASE):
+        super().__init__(database_path, thread_name_prefix="quiz_history")
+
+    def record_attempt_sync(self, quiz_id, member_id, rank, score, fails, passed, reason, attempted_at):
+        connection = self.connect()
+        with connection:
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO attempts "
+                "(quiz_id, member_id, rank, score, fails, passed, reason, attempted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (quiz_id, member_id, rank, score, fails, int(passed), reason, attempted_at),
+            ).rowcount
+            if not inserted:
+                return False
+
+            member_totals = connection.execute(
+                "SELECT attempts, passes FROM member_totals WHERE member_id = ? AND rank = ?", (member_id, rank)
+            ).fetchone()
+            previous_attempts, previous_passes = member_totals or (0, 0)
+            connection.execute(
+                "INSERT OR REPLACE INTO member_totals (member_id, rank, attempts, passes) VALUES (?, ?, ?, ?)",
+                (member_id, rank, previous_attempts + 1, previous_passes + int(passed)),
+            )
+            connection.execute(
+                "INSERT INTO rank_totals (rank, attempts, passes) VALUES (?, 1, ?) "
+                "ON CONFLICT (rank) DO UPDATE SET attempts = attempts + 1, passes = passes + excluded.passes",
+                (rank, int(passed)),
+            )
+            if passed and not previous_passes:
+                connection.execute(
+                    "INSERT INTO fails_before_pass (rank, failed_attempts, members) VALUES (?, ?, 1) "
+                    "ON CONFLICT (rank, failed_attempts) DO UPDATE SET members = members + 1",
+                    (rank, previous_attempts),
+                )
+            return True
+
+    def get_rank_stats_sync(self, rank=None):
+        """Attempts, passes and the fails before the first pass per rank."""
+        connection = self.connect()
+        if rank:
+            totals = connection.execute("SELECT rank, attempts, passes FROM rank_totals WHERE rank = ?", (rank,))
+        else:
+            totals = connection.execute("SELECT rank, attempts, passes FROM rank_totals")
+        rank_stats = dict()
+        for rank_name, attempts, passes in totals.fetchall():
+            histogram = connection.execute(
+                "SELECT failed_attempts, members FROM fails_before_pass WHERE rank = ? ORDER BY failed_attempts",
+                (rank_name,),
+            ).fetchall()
+            rank_stats[rank_name] = {
+                "attempts": attempts,
+                "passes": passes,
+                "fails_before_pass_p50": get_percentile(histogram, 0.5),
+                "fails_before_pass_p90": get_percentile(histogram, 0.9),
+            }
+        return rank_stats
+
+    def get_member_stats_sync(self, member_id):
+        rows = self.connect().execute(
+            "SELECT rank, attempts, passes FROM member_totals WHERE member_id = ?", (member_id,)
+        )
+        return {rank: {"attempts": attempts, "passes": passes} for rank, attempts, passes in rows}
+
+    def get_recent_attempts_sync(self, member_id=None, rank=None, limit=5):
+        query = "SELECT quiz_id, member_id, rank, score, fails, passed, reason, attempted_at FROM attempts"
+        if member_id is not None:
+            query, parameters = query + " WHERE member_id = ?", (member_id,)
+        elif rank:
+            query, parameters = query + " WHERE rank = ?", (rank,)
+        else:
+            parameters = ()
+        rows = self.connect().execute(query + " ORDER BY attempted_at DESC LIMIT ?", (*parameters, limit))
+        columns = ("quiz_id", "member_id", "rank", "score", "fails", "passed", "reason", "attempted_at")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count_attempts_since_sync(self, timestamp):
+        row = self.connect().execute("SELECT COUNT(*) FROM attempts WHERE attempted_at >= ?", (timestamp,)).fetchone()
+        return row[0]
+
+    async def record_attempt(self, quiz_id, member_id, rank, quiz_data, passed, reason=None, attempted_at=None):
+        """Store an attempt. Returns False if the quiz was already recorded."""
+        score, fails = get_attempt_values(quiz_data)
+        attempted_at = attempted_at or time.time()
+        return await self.run(
+            self.record_attempt_sync, quiz_id, member_id, rank, score, fails, passed, reason, attempted_at
+        )
+
+    async def get_rank_stats(self, rank=None):
+        return await self.run(self.get_rank_stats_sync, rank)
+
+    async def get_member_stats(self, member_id):
+        return await self.run(self.get_member_stats_sync, member_id)
+
+    async def get_recent_attempts(self, member_id=None, rank=None, limit=5):
+        return await self.run(self.get_recent_attempts_sync, member_id, rank, limit)
+
+    async def count_attempts_since(self, timestamp):
+        return await self.run(self.count_attempts_since_sync, timestamp)
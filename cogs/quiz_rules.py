@@ -0,0 +1,317 @@
+"""Quiz requirements of the rank system, compiled into validators"""
+import argparse
+import asyncio
+import json
+import operator
+from datetime import datetime
+
+import yaml
+
+from . import data_management
+from . import kotoba_api
+
+# Rule types by the name used in the "rules" list of a rank in settings.yml.
+RULE_TYPES = dict()
+
+
+def register_rule(rule_type):
+    """Class decorator that makes a rule available under rule_type."""
+
+    def register(rule_class):
+        RULE_TYPES[rule_type] = rule_class
+        return rule_class
+
+    return register
+
+
+class QuizRule:
+    """Checks one requirement. check returns the failure reason or None if the quiz meets the requirement."""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def check(self, quiz_data):
+        raise NotImplementedError
+
+
+@register_rule("single_participant")
+class SingleParticipantRule(QuizRule):
+    def check(self, quiz_data):
+        if len(quiz_data["participants"]) > 1:
+            return "Quiz failed due to multiple people participating."
+
+
+@register_rule("shuffle")
+class ShuffleRule(QuizRule):
+    def check(self, quiz_data):
+        if not quiz_data["settings"]["shuffle"]:
+            return "Quiz failed due to the shuffle setting being activated."
+
+
+@register_rule("not_loaded")
+class NotLoadedRule(QuizRule):
+    def check(self, quiz_data):
+        if quiz_data["isLoaded"]:
+            return "Quiz failed due to being loaded."
+
+
+@register_rule("no_multiple_choice")
+class NoMultipleChoiceRule(QuizRule):
+    def check(self, quiz_data):
+        if any(deck["mc"] for deck in quiz_data["decks"]):
+            return "Quiz failed due to being set to multiple choice."
+
+
+@register_rule("full_decks")
+class FullDecksRule(QuizRule):
+    def check(self, quiz_data):
+        for deck in quiz_data["decks"]:
+            if deck.get("startIndex"):
+                return "Quiz failed due to having a start index."
+            if deck.get("endIndex"):
+                return "Quiz failed due to having an end index."
+
+
+@register_rule("decks")
+class DecksRule(QuizRule):
+    """The quiz has to use exactly the listed decks (by short name) in this order."""
+
+    def __init__(self, decks, **options):
+        super().__init__(**options)
+        self.deck_names = list(decks)
+
+    def check(self, quiz_data):
+        if [deck.get("shortName") for deck in quiz_data["decks"]] != self.deck_names:
+            return "Quiz failed due to using the wrong decks."
+
+
+@register_rule("score_limit")
+class ScoreLimitRule(QuizRule):
+    def __init__(self, points, **options):
+        super().__init__(**options)
+        self.points = points
+
+    def check(self, quiz_data):
+        if self.points != quiz_data["settings"]["scoreLimit"]:
+            return "Set score limit and required score limit don't match."
+
+
+@register_rule("answer_time")
+class AnswerTimeRule(QuizRule):
+    def __init__(self, max_time, **options):
+        super().__init__(**options)
+        self.max_time = max_time
+
+    def check(self, quiz_data):
+        if self.max_time != quiz_data["settings"]["answerTimeLimitInMs"]:
+            return "Set answer time does match required answer time."
+
+
+@register_rule("font")
+class FontRule(QuizRule):
+    def __init__(self, font, **options):
+        super().__init__(**options)
+        self.font = font
+
+    def check(self, quiz_data):
+        if self.font != "any" and self.font != quiz_data["settings"]["font"]:
+            return "Set font does not match required font."
+
+
+@register_rule("font_size")
+class FontSizeRule(QuizRule):
+    def __init__(self, font_size, **options):
+        super().__init__(**options)
+        self.font_size = font_size
+
+    def check(self, quiz_data):
+        if self.font_size != quiz_data["settings"]["fontSize"]:
+            return "Set font size does not match required font size."
+
+
+@register_rule("allowed_fails")
+class AllowedFailsRule(QuizRule):
+    def __init__(self, allowed_fails, **options):
+        super().__init__(**options)
+        self.allowed_fails = allowed_fails
+
+    def check(self, quiz_data):
+        failed_question_count = len(quiz_data["questions"]) - quiz_data["scores"][0]["score"]
+        if failed_question_count > self.allowed_fails:
+            return "Failed too many questions."
+
+
+@register_rule("final_score")
+class FinalScoreRule(QuizRule):
+    def __init__(self, points, **options):
+        super().__init__(**options)
+        self.points = points
+
+    def check(self, quiz_data):
+        if self.points != quiz_data["scores"][0]["score"]:
+            return "Not enough questions answered."
+
+
+@register_rule("setting")
+class SettingRule(QuizRule):
+    """Compares any quiz setting to a value.
+
+    Example: {type: setting, setting: effect, operator: eq, value: "none", message: "Effects aren't allowed."}"""
+
+    OPERATORS = {
+        "eq": operator.eq,
+        "ne": operator.ne,
+        "lt": operator.lt,
+        "le": operator.le,
+        "gt": operator.gt,
+        "ge": operator.ge,
+    }
+
+    def __init__(self, setting, value, operator="eq", message=None, **options):
+        super().__init__(**options)
+        self.setting = setting
+        self.value = value
+        self.compare = self.OPERATORS[operator]
+        self.message = message or f"Quiz setting {setting} does not meet the requirement."
+
+    def check(self, quiz_data):
+        setting_value = quiz_data["settings"].get(self.setting)
+        if setting_value is None or not self.compare(setting_value, self.value):
+            return self.message
+
+
+def build_rule(rule_settings):
+    rule_settings = dict(rule_settings)
+    rule_type = rule_settings.pop("type")
+    try:
+        rule_class = RULE_TYPES[rule_type]
+    except KeyError:
+        raise ValueError(f"Unknown quiz rule type: {rule_type}")
+    return rule_class(**rule_settings)
+
+
+class QuizValidator:
+    """All rules of one rank, checked in order. The first failing rule decides the failure reason."""
+
+    def __init__(self, rank_data, rules):
+        self.rank_data = rank_data
+        self.name = rank_data["name"]
+        self.command = rank_data["command"]
+        self.rules = rules
+
+    def validate(self, quiz_data):
+        """Returns (passed, failure reason)."""
+        for rule in self.rules:
+            failure_reason = rule.check(quiz_data)
+            if failure_reason:
+                return False, failure_reason
+        return True, None
+
+
+def compile_rank_rules(rank_data):
+    """Compile the requirements of a rank_data entry.
+
+    The fixed keys (points, max_time, font, font_size, allowed_fails) always apply. Additional rules can be
+    listed under "rules" as mappings with a "type" from RULE_TYPES and that rule's options."""
+    rules = [
+        SingleParticipantRule(),
+        ShuffleRule(),
+        NotLoadedRule(),
+        NoMultipleChoiceRule(),
+        FullDecksRule(),
+        ScoreLimitRule(rank_data["points"]),
+        AnswerTimeRule(rank_data["max_time"]),
+        FontRule(rank_data["font"]),
+        FontSizeRule(rank_data["font_size"]),
+        AllowedFailsRule(rank_data["allowed_fails"]),
+        FinalScoreRule(rank_data["points"]),
+    ]
+    rules.extend(build_rule(rule_settings) for rule_settings in rank_data.get("rules", []))
+    return QuizValidator(rank_data, rules)
+
+
+def compile_rank_system(rank_data):
+    """Validators by the deck string (rank name) of the quiz."""
+    return {rank["name"]: compile_rank_rules(rank) for rank in rank_data}
+
+
+def get_deck_string(quiz_data):
+    """The short deck names joined with +, or None for quizzes without deck names (e.g. reviews)."""
+    try:
+        return "+".join(deck["shortName"] for deck in quiz_data["decks"])
+    except KeyError:
+        return None
+
+
+#########################################
+
+# Batch audits over archived reports
+
+
+def audit_reports(validators, reports):
+    """Validate (quiz_id, report) pairs against the validator of the rank the quiz was for.
+
+    Reports that aren't rank quizzes are skipped. Returns a dict of quiz_id to (rank name, passed, reason)."""
+    results = dict()
+    for quiz_id, quiz_data in reports:
+        validator = validators.get(get_deck_string(quiz_data))
+        if not validator:
+            continue
+        try:
+            passed, reason = validator.validate(quiz_data)
+        except (KeyError, IndexError, TypeError) as error:
+            passed, reason = False, f"Malformed report: {error!r}"
+        results[quiz_id] = (validator.name, passed, reason)
+    return results
+
+
+async def load_processed_reports(since=None):
+    """Archived reports of the processed quizzes, optionally only those processed after since."""
+    processed_quizzes = await data_management.load_data(kotoba_api.PROCESSED_QUIZZES_FILENAME)
+    loop = asyncio.get_running_loop()
+    reports = []
+    for quiz_id, processed_at in sorted(processed_quizzes.items(), key=lambda item: item[1]):
+        if since and processed_at < since:
+            continue
+        report = await loop.run_in_executor(None, kotoba_api.read_report, quiz_id)
+        if report is not None:
+            reports.append((quiz_id, report))
+    return reports
+
+
+async def main(arguments):
+    with open(arguments.settings) as settings_file:
+        config = yaml.safe_load(settings_file)
+    validators = compile_rank_system(config["rank_system"]["rank_data"])
+    since = datetime.fromisoformat(arguments.since) if arguments.since else None
+    # Read the processed quizzes from the same backend the bot uses.
+    data_management.setup_storage(config.get("data_management", {}))
+    try:
+        reports = await load_processed_reports(since)
+    finally:
+        await data_management.storage.close()
+    results = audit_reports(validators, reports)
+
+    for quiz_id, (rank_name, passed, reason) in results.items():
+        print(f"{quiz_id} {rank_name}: {'passed' if passed else 'failed - ' + reason}")
+    failed_count = sum(1 for _, passed, _ in results.values() if not passed)
+    print(f"QUIZ RULES: Audited {len(results)} rank quizzes, {failed_count} do not meet the current rules.")
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(
+                {
+                    quiz_id: {"rank": rank_name, "passed": passed, "reason": reason}
+                    for quiz_id, (rank_name, passed, reason) in results.items()
+                },
+                output_file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-check archived rank quizzes against the current rank rules.")
+    parser.add_argument("--settings", default="settings.yml")
+    parser.add_argument("--since", help="Only quizzes processed on or after this date, e.g. 2024-05-01.")
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    asyncio.run(main(parser.parse_args()))
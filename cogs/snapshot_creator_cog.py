@@ -4,10 +4,11 @@ from discord.ext import tasks
 
 from datetime import datetime
 import asyncio
-import yaml
 import os
 import time
 
+from . import data_management
+
 
 async def save_role_display_icon(role: discord.Role):
     icon_asset = role.display_icon
@@ -183,8 +184,14 @@ class StateSaver(commands.Cog):
         await save_pin_data_to_snapshot(guild, snapshot_data)
         await save_threads_to_snapshot(guild, snapshot_data)
         print("STATE SAVER: Saving snapshot data to file: " + snapshot_data["name"] + ".yml")
-        with open(f"data/snapshot_data/{guild.id}/{snapshot_data['name']}.yml", "w") as snapshot_file:
-            yaml.dump(snapshot_data, snapshot_file)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None,
+            data_management.dump_yaml_file,
+            snapshot_data,
+            f"data/snapshot_data/{guild.id}/{snapshot_data['name']}.yml",
+            False,
+        )
 
     @tasks.loop(hours=24)
     async def snapshot_loop(self):
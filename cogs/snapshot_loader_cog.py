@@ -4,10 +4,11 @@ from discord.ext import tasks
 
 from datetime import datetime
 import asyncio
-import yaml
 import os
 import glob
 
+from . import data_management
+
 
 async def snapshot_autocomplete(interaction: discord.Interaction, current_input: str):
     folder_path = "data/snapshot_data"
@@ -267,8 +268,8 @@ class StateLoader(commands.Cog):
     @discord.app_commands.default_permissions(administrator=True)
     async def load_snapshot(self, interaction: discord.Interaction, file_path: str):
         await interaction.response.defer()
-        with open(file_path, "r") as snapshot_file:
-            snapshot_data = yaml.safe_load(snapshot_file)
+        loop = asyncio.get_running_loop()
+        snapshot_data = await loop.run_in_executor(None, data_management.load_yaml_file, file_path, False)
 
         bot_role = await check_if_top_role(interaction.guild, self.bot)
         if not bot_role:
@@ -0,0 +1,175 @@
+"""SQLite storage backend for data_management"""
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import pickle
+import sqlite3
+
+import yaml
+
+DEFAULT_DATABASE = "data/bot_data.sqlite3"
+PICKLE_PROTOCOL = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_name TEXT PRIMARY KEY,
+    is_mapping INTEGER NOT NULL,
+    value BLOB
+);
+CREATE TABLE IF NOT EXISTS entries (
+    file_name TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (file_name, key)
+) WITHOUT ROWID;
+"""
+
+
+def encode(value):
+    return pickle.dumps(value, protocol=PICKLE_PROTOCOL)
+
+
+def decode(value):
+    return pickle.loads(value)
+
+
+class SqliteDatabase:
+    """A SQLite database in WAL mode whose connection is owned by one dedicated worker thread.
+
+    Subclasses set schema and implement blocking *_sync methods, which the async methods pass to run."""
+
+    schema = ""
+
+    def __init__(self, database_path, thread_name_prefix="sqlite"):
+        self.database_path = database_path
+        self.connection = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=thread_name_prefix)
+
+    def connect(self):
+        if not self.connection:
+            self.connection = sqlite3.connect(self.database_path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(self.schema)
+        return self.connection
+
+    async def run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    def close_sync(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    async def close(self):
+        await self.run(self.close_sync)
+        self.executor.shutdown(wait=True)
+
+
+class SqliteStorage(SqliteDatabase):
+    """Stores mapping documents as one row per key, so a changed key is a single upsert."""
+
+    schema = SCHEMA
+
+    def __init__(self, database_path=DEFAULT_DATABASE):
+        super().__init__(database_path, thread_name_prefix="sqlite_storage")
+
+    def read_sync(self, file_name, return_list=False):
+        connection = self.connect()
+        document = connection.execute(
+            "SELECT is_mapping, value FROM documents WHERE file_name = ?", (file_name,)
+        ).fetchone()
+        if not document:
+            return [] if return_list else {}
+
+        is_mapping, value = document
+        if not is_mapping:
+            return decode(value)
+        rows = connection.execute("SELECT key, value FROM entries WHERE file_name = ?", (file_name,))
+        return {decode(key): decode(value) for key, value in rows}
+
+    def read_value_sync(self, file_name, key, default=None):
+        row = (
+            self.connect()
+            .execute("SELECT value FROM entries WHERE file_name = ? AND key = ?", (file_name, encode(key)))
+            .fetchone()
+        )
+        return decode(row[0]) if row else default
+
+    def write_sync(self, file_name, data, changed_keys=None, removed_keys=None):
+        connection = self.connect()
+        with connection:
+            if not isinstance(data, dict):
+                connection.execute(
+                    "INSERT OR REPLACE INTO documents (file_name, is_mapping, value) VALUES (?, 0, ?)",
+                    (file_name, encode(data)),
+                )
+                connection.execute("DELETE FROM entries WHERE file_name = ?", (file_name,))
+                return
+
+            connection.execute(
+                "INSERT OR REPLACE INTO documents (file_name, is_mapping, value) VALUES (?, 1, NULL)", (file_name,)
+            )
+            if changed_keys is None:
+                connection.execute("DELETE FROM entries WHERE file_name = ?", (file_name,))
+                changed_keys = data.keys()
+            connection.executemany(
+                "DELETE FROM entries WHERE file_name = ? AND key = ?",
+                [(file_name, encode(key)) for key in removed_keys or ()],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO entries (file_name, key, value) VALUES (?, ?, ?)",
+                [(file_name, encode(key), encode(data[key])) for key in changed_keys if key in data],
+            )
+
+    async def read(self, file_name, return_list=False):
+        return await self.run(self.read_sync, file_name, return_list)
+
+    async def read_value(self, file_name, key, default=None):
+        return await self.run(self.read_value_sync, file_name, key, default)
+
+    async def write(self, file_name, data, changed_keys=None, removed_keys=None):
+        await self.run(self.write_sync, file_name, data, changed_keys, removed_keys)
+
+
+#########################################
+
+# Migration from the YAML data files
+
+
+def find_yaml_files(data_folder):
+    return sorted(
+        file_name
+        for file_name in os.listdir(data_folder)
+        if file_name.endswith((".yml", ".yaml")) and os.path.isfile(os.path.join(data_folder, file_name))
+    )
+
+
+def migrate_yaml_files(data_folder="data", database_path=DEFAULT_DATABASE):
+    """Import every YAML file in the data folder into the SQLite database."""
+    storage = SqliteStorage(database_path)
+    migrated_files = []
+    try:
+        for file_name in find_yaml_files(data_folder):
+            with open(os.path.join(data_folder, file_name)) as file:
+                data = yaml.safe_load(file)
+            if data is None:
+                continue
+            storage.write_sync(file_name, data)
+            migrated_files.append(file_name)
+            print(f"SQLITE STORAGE: Imported {file_name}")
+    finally:
+        storage.close_sync()
+        storage.executor.shutdown()
+    return migrated_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the YAML data files into the SQLite storage backend.")
+    parser.add_argument("--data-folder", default="data")
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    arguments = parser.parse_args()
+    files = migrate_yaml_files(arguments.data_folder, arguments.database)
+    print(f"SQLITE STORAGE: Imported {len(files)} files into {arguments.database}.")
@@ -4,6 +4,19 @@ from discord.ext import tasks
 
 import random
 import asyncio
+import collections
+import hashlib
+import json
+import time
+import yaml
+
+from . import data_management
+
+PINNED_EMBED_HASHES_FILE_NAME = "pinned_embed_hashes.yml"
+# Channel ID -> board title -> message IDs of the pages in page order.
+PIN_REGISTRY_FILE_NAME = "pin_registry.yml"
+# Channel ID -> pins and unpins made by the bot whose pins update event shouldn't trigger a reconciliation.
+own_pin_updates = collections.Counter()
 
 
 async def random_delay():
@@ -11,11 +24,71 @@ async def random_delay():
     await asyncio.sleep(delay)
 
 
+class RateLimiter:
+    """Spaces out API calls so that at most `calls` of them start in any `period` seconds."""
+
+    def __init__(self, calls, period):
+        self.interval = period / calls
+        self.next_slot = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            delay = self.next_slot - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_slot = time.monotonic() + self.interval
+
+
 async def get_past_user_pins(channel: discord.TextChannel, member: discord.Member):
     past_pins = [pin for pin in await channel.pins() if pin.author.id == member.id]
     return past_pins
 
 
+async def reconcile_pin_registry(channel: discord.TextChannel, member: discord.Member):
+    """Rebuild the registered boards of a channel from its actual pins."""
+    boards = dict()
+    for pin in sorted(await get_past_user_pins(channel, member), key=lambda pin: pin.id):
+        if pin.embeds and pin.embeds[0].title:
+            boards.setdefault(pin.embeds[0].title, []).append(pin.id)
+
+    old_boards = await data_management.load_value(PIN_REGISTRY_FILE_NAME, channel.id, {})
+    pinned_ids = {message_id for message_ids in boards.values() for message_id in message_ids}
+    for message_ids in old_boards.values():
+        for message_id in message_ids:
+            if message_id not in pinned_ids:
+                await data_management.delete_value(PINNED_EMBED_HASHES_FILE_NAME, message_id)
+    await data_management.set_value(PIN_REGISTRY_FILE_NAME, channel.id, boards)
+    return boards
+
+
+async def get_board_pin_ids(channel: discord.TextChannel, embed_title):
+    boards = await data_management.load_value(PIN_REGISTRY_FILE_NAME, channel.id)
+    if boards is None:
+        boards = await reconcile_pin_registry(channel, channel.guild.me)
+    return list(boards.get(embed_title, []))
+
+
+async def change_own_pin(channel: discord.TextChannel, message, pin):
+    """Pin or unpin a message of the bot. Counted before the request, as the event can arrive before the response."""
+    own_pin_updates[channel.id] += 1
+    try:
+        if pin:
+            await message.pin()
+        else:
+            await message.unpin()
+    except discord.HTTPException:
+        own_pin_updates[channel.id] -= 1
+        raise
+
+
+async def send_board_page(channel: discord.TextChannel, embed: discord.Embed):
+    new_pin = await channel.send(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+    await change_own_pin(channel, new_pin, pin=True)
+    await data_management.set_value(PINNED_EMBED_HASHES_FILE_NAME, new_pin.id, get_embed_hash(embed))
+    return new_pin.id
+
+
 async def create_fields(lines):
     fields = []
     current_field = []
@@ -40,16 +113,47 @@ async def create_embeds_from_fields(fields, embed_title, inline=False):
     return embeds
 
 
-async def update_embeds(pins, embeds, embed_title, channel):
-    filtered_pins = [pin for pin in pins if pin.embeds and pin.embeds[0].title == embed_title]
-    if len(filtered_pins) < len(embeds):
-        for i in range(len(filtered_pins), len(embeds)):
-            new_pin = await channel.send(embed=embeds[i], allowed_mentions=discord.AllowedMentions.none())
-            await new_pin.pin()
-            filtered_pins.append(new_pin)
-
-    for pin, embed in zip(filtered_pins, embeds):
-        await pin.edit(embed=embed)
+def get_embed_hash(embed: discord.Embed):
+    embed_json = json.dumps(embed.to_dict(), sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(embed_json.encode("utf-8"), digest_size=16).hexdigest()
+
+
+async def update_embeds(embeds, embed_title, channel):
+    """Bring the pinned embeds with this title in line with embeds.
+
+    The pages are looked up in the pin registry instead of fetching the channel pins. The hash of each pin's last
+    content is saved by message ID, so unchanged pages aren't edited again. Pins left over after a board shrank
+    are unpinned."""
+    message_ids = await get_board_pin_ids(channel, embed_title)
+    for embed in embeds[len(message_ids) :]:
+        message_ids.append(await send_board_page(channel, embed))
+
+    edited_count = 0
+    for page, embed in enumerate(embeds):
+        embed_hash = get_embed_hash(embed)
+        if await data_management.load_value(PINNED_EMBED_HASHES_FILE_NAME, message_ids[page]) == embed_hash:
+            continue
+        try:
+            await channel.get_partial_message(message_ids[page]).edit(embed=embed)
+        except discord.NotFound:
+            print(f"UTILITY: Replacing deleted {embed_title} page.")
+            await data_management.delete_value(PINNED_EMBED_HASHES_FILE_NAME, message_ids[page])
+            message_ids[page] = await send_board_page(channel, embed)
+            continue
+        await data_management.set_value(PINNED_EMBED_HASHES_FILE_NAME, message_ids[page], embed_hash)
+        edited_count += 1
+
+    for message_id in message_ids[len(embeds) :]:
+        print(f"UTILITY: Unpinning surplus {embed_title} page.")
+        try:
+            await change_own_pin(channel, channel.get_partial_message(message_id), pin=False)
+        except discord.NotFound:
+            pass
+        await data_management.delete_value(PINNED_EMBED_HASHES_FILE_NAME, message_id)
+
+    await data_management.set_value(PIN_REGISTRY_FILE_NAME, [channel.id, embed_title], message_ids[: len(embeds)])
+    if edited_count:
+        print(f"UTILITY: Edited {edited_count} of {len(embeds)} {embed_title} pages.")
 
 
 async def get_member_rank(member: discord.Member, bot):
@@ -66,8 +170,28 @@ class Utility(commands.Cog):
     async def cog_load(self):
         await self.bot.wait_until_ready()
         self.guild = self.bot.get_guild(self.bot.config["guild_id"])
+        await self.reconcile_pin_registries()
         self.thread_joiner.start()
 
+    async def reconcile_pin_registries(self):
+        """Pins may have changed while the bot was offline."""
+        pin_registry = await data_management.load_data(PIN_REGISTRY_FILE_NAME)
+        for channel_id in pin_registry:
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                await reconcile_pin_registry(channel, channel.guild.me)
+            else:
+                await data_management.delete_value(PIN_REGISTRY_FILE_NAME, channel_id)
+
+    @commands.Cog.listener(name="on_guild_channel_pins_update")
+    async def update_pin_registry(self, channel, last_pin):
+        # The registry already knows about the board pages the bot pinned or unpinned itself.
+        if own_pin_updates[channel.id] > 0:
+            own_pin_updates[channel.id] -= 1
+            return
+        if await data_management.load_value(PIN_REGISTRY_FILE_NAME, channel.id) is not None:
+            await reconcile_pin_registry(channel, channel.guild.me)
+
     @commands.command()
     @commands.is_owner()
     async def sync(self, ctx: discord.ext.commands.Context):
@@ -77,6 +201,15 @@ class Utility(commands.Cog):
         await self.bot.tree.sync(guild=discord.Object(id=ctx.guild.id))
         await ctx.send(f"Synced commands to guild with id {ctx.guild.id}.")
 
+    @commands.command()
+    @commands.is_owner()
+    async def reload_config(self, ctx: discord.ext.commands.Context):
+        """Reload settings.yml and let cogs rebuild what they derive from it."""
+        with open("settings.yml") as config_file:
+            self.bot.config = yaml.safe_load(config_file)
+        self.bot.dispatch("config_reload")
+        await ctx.send("Reloaded settings.yml.")
+
     @commands.command()
     @commands.is_owner()
     async def clear_global_commands(self, ctx):
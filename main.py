@@ -4,6 +4,8 @@ import yaml
 
 from discord.ext import commands
 
+from cogs import data_management
+
 TESTING_MODE = False
 TESTING_COGS = ["cogs.nickname_counter_cog"]
 TESTING_PREFIX = "$"
@@ -14,6 +16,8 @@ class PersonalBot(commands.Bot):
         with open("settings.yml") as config_file:
             self.config = yaml.safe_load(config_file)
 
+        data_management.setup_storage(self.config.get("data_management", {}))
+
         if not TESTING_MODE:
             command_prefix = self.config["bot"]["command_prefix"]
         else:
@@ -30,8 +34,20 @@ class PersonalBot(commands.Bot):
 
     async def on_ready(self):
         print(f"Logged in as {self.user}")
+        data_settings = self.config.get("data_management", {})
+        data_management.start_flush_loop(
+            data_settings.get("flush_interval_seconds", data_management.DEFAULT_FLUSH_INTERVAL)
+        )
         await self.load_cogs()
 
+    async def close(self):
+        # Unloading the extensions lets cogs write out buffered data before the final flush.
+        for extension in list(self.extensions):
+            await self.unload_extension(extension)
+        await data_management.stop_flush_loop()
+        print("Flushed data to disk.")
+        await super().close()
+
     async def load_cogs(self):
         cog_folder = "cogs"
 